@@ -1,33 +1,74 @@
 import os
-import requests
+import threading
+import multiprocessing
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import gff3
+import http_client
 import download_fasta
 
+# URL da página com os links das classes (configurável para testes com um servidor local)
+APTE_DOWNLOAD_URL = os.environ.get("APTE_DOWNLOAD_URL", "http://apte.cp.utfpr.edu.br/download")
+
+# Espécies baixadas em paralelo (threads) e genomas separados em paralelo (processos)
+DOWNLOAD_WORKERS = 4
+SPLIT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Accessions já encontradas ("<organismo>\t<accession>"), para não consultar o NCBI a cada execução.
+# Fica fora de data/ (só pastas de espécies); o arquivo antigo em data/ é movido na primeira leitura
+ACCESSIONS_FILE = "accessions.tsv"
+LEGACY_ACCESSIONS_FILE = os.path.join("data", "accessions.tsv")
+_accessions_lock = threading.Lock()
+
 def merge_gff3_files(input_files, output_file):
-	""" Junta vários arquivos .gff3 em um único arquivo, garantindo que os cabeçalhos sejam mantidos apenas uma vez. """
-	with open(output_file, 'w') as out_f:
-		header_written = False  # Para evitar múltiplos cabeçalhos
-
-		for file in input_files:
-			with open(file, 'r') as in_f:
-				for line in in_f:
-					if line.startswith("##") and header_written:
-						continue  # Ignora cabeçalhos repetidos
-					if line.startswith("##") and not header_written:
-						header_written = True  # Escreve o cabeçalho apenas uma vez
-					out_f.write(line)
-			os.remove(file)  # Remove o arquivo original
+	""" Junta vários arquivos .gff3 em um único arquivo ordenado por (seqid, start, end), sem anotações repetidas e com um único cabeçalho. """
+	written, duplicates, skipped = gff3.merge_sorted(input_files, f"{output_file}.tmp")
+	print(f"{written} anotações combinadas ({duplicates} duplicadas removidas, {skipped} linhas malformadas ignoradas)")
+
+	# Só agora o arquivo combinado ganha o nome final (ele marca a espécie como baixada)
+	os.replace(f"{output_file}.tmp", output_file)
+	for file in input_files:
+		os.remove(file)  # Remove o arquivo original
+		if os.path.exists(f"{file}.sha256"):
+			os.remove(f"{file}.sha256")
 
 	print(f"Arquivo combinado salvo em: {output_file}")
 
+def load_accessions():
+	"""Lê as accessions memorizadas em ACCESSIONS_FILE"""
+	accessions = {}
+	if not os.path.exists(ACCESSIONS_FILE) and os.path.exists(LEGACY_ACCESSIONS_FILE):
+		os.replace(LEGACY_ACCESSIONS_FILE, ACCESSIONS_FILE)
+	if os.path.exists(ACCESSIONS_FILE):
+		with open(ACCESSIONS_FILE, "r") as f:
+			for line in f:
+				organism_name, accession = line.rstrip("\n").split("\t")
+				accessions[organism_name] = accession
+	return accessions
+
 def get_genome_accession(organism_name):
-	base_url = "https://api.ncbi.nlm.nih.gov/datasets/v2alpha/genome/taxon/"
+	with _accessions_lock:
+		accession = load_accessions().get(organism_name)
+	if accession:
+		return accession
+
+	accession = fetch_genome_accession(organism_name)
+	if accession:
+		with _accessions_lock:
+			if os.path.dirname(ACCESSIONS_FILE):
+				os.makedirs(os.path.dirname(ACCESSIONS_FILE), exist_ok=True)
+			with open(ACCESSIONS_FILE, "a") as f:
+				f.write(f"{organism_name}\t{accession}\n")
+	return accession
+
+def fetch_genome_accession(organism_name):
+	base_url = f"{download_fasta.NCBI_DATASETS_API}genome/taxon/"
 
 	# Substitui espaços por %20 (ou usa requests para lidar automaticamente)
 	taxon_url = base_url + f"{organism_name}/dataset_report"
 
-	response = requests.get(taxon_url)
+	response = http_client.get(taxon_url)
 
 	if response.status_code == 200:
 		data = response.json()
@@ -41,18 +82,12 @@ def get_genome_accession(organism_name):
 		print(f"Erro ao buscar accession (Status: {response.status_code})")
 		return None
 
-if __name__ == "__main__":
-	# URL da página com os links das classes
-	url_base = "http://apte.cp.utfpr.edu.br/download"
-
-	# Criar diretório base se não existir
-	output_dir = "data"
-	os.makedirs(output_dir, exist_ok=True)
-
-	# Obter o conteúdo da página
-	response = requests.get(url_base)
+def list_species(url_base):
+	"""Lê a página de downloads do APTE e retorna [(espécie, organismo, [URLs dos .gff3])]"""
+	response = http_client.get(url_base)
 	soup = BeautifulSoup(response.text, 'html.parser')
 
+	species = []
 	# Procurar todas as tabelas e links de download
 	for row in soup.find_all("tr"):  # Itera pelas linhas da tabela
 		columns = row.find_all("td")
@@ -60,10 +95,8 @@ if __name__ == "__main__":
 			species_name = columns[0].text.strip().split(" - ")[0].replace(". ", "")  # Nome da espécie sem o número de TEs
 			species_name = species_name.replace(species_name[1],  species_name[1].upper(), 1)  # Corrige a capitalização
 
-			species_dir = os.path.join(output_dir, species_name)
-			os.makedirs(species_dir, exist_ok=True)  # Criar pasta para a espécie
-
-			gff3_files = []
+			organism_name = None
+			file_urls = []
 
 			# Itera pelos links de download
 			for col in columns[1:]:  # Ignora a primeira coluna (nome da espécie)
@@ -78,25 +111,81 @@ if __name__ == "__main__":
 					if file_name == "TEAnnotationFinal.gff3":
 						continue # Ignora o arquivo TEAnnotationFinal.gff3
 
-					file_path = os.path.join(species_dir, file_name)
-
-					# Baixar o arquivo
-					with requests.get(file_url, stream=True) as file_resp:
-						if file_resp.status_code == 200:
-							with open(file_path, "wb") as f:
-								for chunk in file_resp.iter_content(chunk_size=8192):
-									f.write(chunk)
-							gff3_files.append(file_path)
-							print(f"Baixado: {file_path}")
-						else:
-							print(f"Erro ao baixar {file_url}")
-
-			merge_gff3_files(gff3_files, os.path.join(species_dir, f"{species_name}_TER_merged.gff3"))
-
-			# Baixar o arquivo FASTA
-			accession = get_genome_accession(organism_name)
-			if accession:
-				download_fasta.baixar_fasta(accession, species_name)
-				print()
+					file_urls.append(file_url)
+
+			species.append((species_name, organism_name, file_urls))
+	return species
+
+def download_species(species_name, organism_name, file_urls, output_dir, split_executor):
+	"""Baixa os .gff3 e o genoma de uma espécie; a separação dos cromossomos vai para o pool de processos"""
+	species_dir = os.path.join(output_dir, species_name)
+	os.makedirs(species_dir, exist_ok=True)  # Criar pasta para a espécie
+
+	merged_file = os.path.join(species_dir, f"{species_name}_TER_merged.gff3")
+	if os.path.exists(merged_file):
+		print(f"Arquivo combinado já existe: {merged_file}")
+	else:
+		gff3_files = []
+		for file_url in file_urls:
+			file_path = os.path.join(species_dir, file_url.split("/")[-1])
+
+			# Baixar o arquivo (retomando downloads interrompidos; arquivos já verificados são pulados)
+			result = http_client.download_file(file_url, file_path)
+			if result.ok:
+				gff3_files.append(file_path)
+				print(f"Baixado: {file_path}")
 			else:
-				print("Não foi possível baixar o arquivo FASTA.")
\ No newline at end of file
+				print(f"Erro ao baixar {file_url}")
+
+		if len(gff3_files) < len(file_urls):
+			print(f"Downloads incompletos para {species_name}; os arquivos baixados serão reaproveitados na próxima execução")
+			return None
+		merge_gff3_files(gff3_files, merged_file)
+
+	# Baixar o arquivo FASTA
+	accession = get_genome_accession(organism_name) if organism_name else None
+	if not accession:
+		print(f"Não foi possível baixar o arquivo FASTA de {species_name}.")
+		return None
+
+	caminho_zip = download_fasta.baixar_genoma(accession, species_name)
+	if not caminho_zip:
+		return None
+
+	# A separação roda em outro processo enquanto esta thread segue para a próxima espécie
+	return split_executor.submit(download_fasta.separar_genoma, caminho_zip, accession, species_name, 1)
+
+if __name__ == "__main__":
+	# Criar diretório base se não existir
+	output_dir = "data"
+	os.makedirs(output_dir, exist_ok=True)
+
+	# Obter o conteúdo da página
+	species = list_species(APTE_DOWNLOAD_URL)
+
+	# Os processos de separação são criados com spawn: um fork feito enquanto as threads de download
+	# seguram locks (sessão HTTP, logging) pode deixar o processo filho travado para sempre
+	split_context = multiprocessing.get_context("spawn")
+	with ProcessPoolExecutor(max_workers=SPLIT_WORKERS, mp_context=split_context) as split_executor, ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as download_executor:
+		downloads = {
+			download_executor.submit(download_species, species_name, organism_name, file_urls, output_dir, split_executor): species_name
+			for species_name, organism_name, file_urls in species
+		}
+
+		splits = {}
+		for future in as_completed(downloads):
+			species_name = downloads[future]
+			try:
+				split = future.result()
+			except Exception as e:
+				print(f"Erro ao baixar {species_name}: {e}")
+				continue
+			if split is not None:
+				splits[split] = species_name
+
+		for split in as_completed(splits):
+			try:
+				split.result()
+				print(f"Cromossomos separados: {splits[split]}")
+			except Exception as e:
+				print(f"Erro ao separar os cromossomos de {splits[split]}: {e}")
@@ -1,11 +1,22 @@
+import io
 import os
+import re
+import hashlib
 import sys
-import requests
 import zipfile
-import shutil
+import http_client
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 
-# URL da API para buscar detalhes do assembly
-NCBI_ASSEMBLY_API = "https://api.ncbi.nlm.nih.gov/datasets/v2alpha/genome/accession/"
+# URL da API para buscar detalhes do assembly (configurável para testes com um servidor local)
+NCBI_DATASETS_API = os.environ.get("NCBI_DATASETS_API", "https://api.ncbi.nlm.nih.gov/datasets/v2alpha/")
+NCBI_ASSEMBLY_API = f"{NCBI_DATASETS_API}genome/accession/"
+
+# Buffer de leitura/escrita dos arquivos de cromossomo (poucas chamadas de sistema por cromossomo)
+IO_BUFFER_SIZE = 1024 * 1024
+
+# Separadores das palavras de um cabeçalho FASTA
+HEADER_SEPARATORS = re.compile(r"[\s,;|]+")
 
 def get_chromosomes_from_gff3(gff3_file):
 	"""
@@ -25,36 +36,54 @@ def get_chromosomes_from_gff3(gff3_file):
 
 	return chromosomes
 
-def split_fna_by_chromosome(fna_file, gff3_file, output_folder):
+def find_chromosome(header, valid_chromosomes):
 	"""
-	Separa um arquivo .fna em vários arquivos, um para cada cromossomo listado no .gff3.
+	Procura no conjunto de cromossomos válidos o ID do cabeçalho e, se não estiver, cada palavra da descrição.
+	A comparação é exata (LG1 não casa com LG10) e cada consulta é O(1).
 	"""
-	# Obtém os cromossomos válidos do arquivo .gff3
-	valid_chromosomes = get_chromosomes_from_gff3(gff3_file)
+	for token in HEADER_SEPARATORS.split(header[1:].strip()):
+		if token in valid_chromosomes:
+			return token
+	return None
 
-	# Criando pasta de saída, se não existir
-	os.makedirs(output_folder, exist_ok=True)
+@contextmanager
+def open_fna(fna_file, zip_path=None):
+	"""Abre um .fna em disco ou, com zip_path, descompacta o membro do .zip sob demanda (sem extraí-lo)"""
+	if zip_path is None:
+		with open(fna_file, 'r', buffering=IO_BUFFER_SIZE) as fna:
+			yield fna
+		return
+
+	with zipfile.ZipFile(zip_path, 'r') as zip_ref, zip_ref.open(fna_file) as member:
+		yield io.TextIOWrapper(io.BufferedReader(member, buffer_size=IO_BUFFER_SIZE), encoding="utf-8")
 
+def _split_to_temp(fna_file, output_folder, valid_chromosomes, zip_path=None):
+	"""
+	Grava cada cromossomo encontrado no .fna em um arquivo temporário da pasta de saída.
+	Retorna [(cromossomo, arquivo temporário)] na ordem do .fna; quem move para o lugar final é o chamador.
+	"""
+	valid_chromosomes = set(valid_chromosomes)
+	written = []
 	output_file = None
 
-	with open(fna_file, 'r') as fna:
+	with open_fna(fna_file, zip_path) as fna:
 		for line in fna:
 			if line.startswith(">"):  # Nova sequência de cromossomo encontrada
+				if output_file:
+					output_file.close()
 
 				# Encontra qual cromossomo está presente na linha
-				found_chromosome = next((chrom for chrom in valid_chromosomes if chrom in line), None)
+				found_chromosome = find_chromosome(line, valid_chromosomes)
 				
 				if found_chromosome:  # Verifica se está no GFF3
-					if output_file:
-						output_file.close()
-
-					output_path = os.path.join(output_folder, f"{found_chromosome}.fasta")
-					output_file = open(output_path, "w")
+					tmp_path = os.path.join(output_folder, f".{found_chromosome}.fasta.{os.getpid()}.tmp")
+					output_file = open(tmp_path, "w", buffering=IO_BUFFER_SIZE)
 					output_file.write(line)  # Escreve a linha do cabeçalho
+					written.append((found_chromosome, tmp_path))
 
 					valid_chromosomes.remove(found_chromosome)  # Remove o cromossomo da lista
 
-					print(f"Criando arquivo: {output_path}")
+					print(f"Criando arquivo: {os.path.join(output_folder, f'{found_chromosome}.fasta')}")
 				else:
 					output_file = None  # Ignorar este cromossomo
 
@@ -63,6 +92,53 @@ def split_fna_by_chromosome(fna_file, gff3_file, output_folder):
 
 	if output_file:
 		output_file.close()
+	return written
+
+def _place_chromosomes(written_per_file, output_folder):
+	"""Move os temporários para <cromossomo>.fasta; um cromossomo presente em vários .fna fica com o do primeiro"""
+	placed = set()
+	for written in written_per_file:
+		for chromosome, tmp_path in written:
+			if chromosome in placed:
+				os.remove(tmp_path)
+				continue
+			os.replace(tmp_path, os.path.join(output_folder, f"{chromosome}.fasta"))
+			placed.add(chromosome)
+
+def split_fna_by_chromosome(fna_file, gff3_file, output_folder, valid_chromosomes=None, zip_path=None):
+	"""
+	Separa um arquivo .fna em vários arquivos, um para cada cromossomo listado no .gff3.
+	Com zip_path, fna_file é o nome do membro dentro do .zip e é lido em streaming.
+	"""
+	# Obtém os cromossomos válidos do arquivo .gff3
+	if valid_chromosomes is None:
+		valid_chromosomes = get_chromosomes_from_gff3(gff3_file)
+
+	# Criando pasta de saída, se não existir
+	os.makedirs(output_folder, exist_ok=True)
+
+	_place_chromosomes([_split_to_temp(fna_file, output_folder, valid_chromosomes, zip_path)], output_folder)
+
+def split_fna_files(fna_files, gff3_file, output_folder, max_workers=None, zip_path=None):
+	"""
+	Separa vários arquivos .fna (ou membros de um .zip) em paralelo, um processo por arquivo.
+	Cada processo grava em temporários próprios; o processo principal decide qual cópia de cada
+	cromossomo fica (a do primeiro .fna da lista, como na separação sequencial).
+	"""
+	valid_chromosomes = get_chromosomes_from_gff3(gff3_file)
+
+	if len(fna_files) == 1:
+		split_fna_by_chromosome(fna_files[0], gff3_file, output_folder, valid_chromosomes, zip_path)
+		return
+
+	os.makedirs(output_folder, exist_ok=True)
+	with ProcessPoolExecutor(max_workers=max_workers or min(len(fna_files), os.cpu_count() or 1)) as executor:
+		futures = [
+			executor.submit(_split_to_temp, fna_file, output_folder, valid_chromosomes, zip_path)
+			for fna_file in fna_files
+		]
+		written_per_file = [future.result() for future in futures]
+	_place_chromosomes(written_per_file, output_folder)
 
 def separar_cromossomos(arquivo_fna, pasta_saida):
 	"""Separa um arquivo .fna em vários arquivos FASTA individuais para cada cromossomo."""
@@ -98,41 +174,81 @@ def separar_cromossomos(arquivo_fna, pasta_saida):
 			print(f"Salvo: {caminho_arquivo}")
 
 
-def baixar_fasta(genome_id, species_name):
-	"""Baixa o arquivo FASTA para um genoma Assembly do NCBI."""
+def verificar_zip(caminho_zip):
+	"""Confere o .zip do NCBI pelo md5sum.txt do próprio pacote (ou, na falta dele, pelos CRCs do zip)"""
+	try:
+		with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
+			membros = set(zip_ref.namelist())
+			manifesto = next((m for m in membros if m.endswith("md5sum.txt")), None)
+			if manifesto is None:
+				return zip_ref.testzip() is None
+
+			prefixo = manifesto[:-len("md5sum.txt")]
+			for linha in zip_ref.read(manifesto).decode().splitlines():
+				if not linha.strip():
+					continue
+				md5_esperado, nome = linha.split(maxsplit=1)
+				nome = prefixo + nome.strip().lstrip("*").removeprefix("./")
+				if nome not in membros:
+					continue
+				digest = hashlib.md5()
+				with zip_ref.open(nome) as membro:
+					for bloco in iter(lambda: membro.read(IO_BUFFER_SIZE), b""):
+						digest.update(bloco)
+				if digest.hexdigest() != md5_esperado.lower():
+					print(f"md5 divergente em {nome}")
+					return False
+	except zipfile.BadZipFile as e:
+		print(f"Arquivo zip inválido {caminho_zip}: {e}")
+		return False
+	return True
+
+def baixar_genoma(genome_id, species_name):
+	"""Baixa o .zip de um genoma Assembly do NCBI em streaming. Retorna o caminho do .zip ou None"""
 	species_dir = os.path.join("data", species_name, "fasta")
 	os.makedirs(species_dir, exist_ok=True)
 
+	# Genoma já baixado, verificado e separado em uma execução anterior
+	if os.path.exists(os.path.join(species_dir, f"{genome_id}.done")):
+		print(f"Genoma {genome_id} já separado, pulando")
+		return None
+
 	# URL correta para acessar o genoma Assembly
 	url = f"{NCBI_ASSEMBLY_API}{genome_id}/download"
 	params = {"include_annotation_type": "GENOME_FASTA"}
 
 	print(f"Baixando {genome_id}.fna da API de Assembly do NCBI...")
-	response = requests.get(url, params=params)
 
-	if response.status_code == 200:
-		file_path = os.path.join(species_dir, f"{genome_id}.zip")
-		with open(file_path, "wb") as f:
-			f.write(response.content)
-		print(f"Download concluído: {file_path}")
+	# Grava o .zip em blocos, à medida que chegam (o genoma nunca fica inteiro na memória), retomando downloads interrompidos
+	caminho_zip = os.path.join(species_dir, f"{genome_id}.zip")
+	resultado = http_client.download_file(url, caminho_zip, params=params, verify=verificar_zip)
+	if not resultado.ok:
+		print(f"Erro ao baixar {genome_id} (Status: {resultado.status_code})")
+		print(f"Resposta do servidor: {resultado.text}")
+		return None
 
-		# Extraindo todos os arquivos
-		print("Extraindo .fna...")
-		caminho_zip = f"{species_dir}/{genome_id}.zip"
-		with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
-			zip_ref.extractall(f"{species_dir}/zip/")
-
-		# Separando todos os cromossomos em arquivos .fasta
-		fna_path = f"{species_dir}/zip/ncbi_dataset/data/{genome_id}/"
-		arquivo_fna = os.listdir(fna_path)[0]
-		split_fna_by_chromosome(f"{fna_path}/{arquivo_fna}", os.path.join("data", species_name, f"{species_name}_TER_merged.gff3"), species_dir)
-
-		# Removendo os arquivos do zip
-		shutil.rmtree(f"{species_dir}/zip/")
-		os.remove(caminho_zip)
-	else:
-		print(f"Erro ao baixar {genome_id} (Status: {response.status_code})")
-		print(f"Resposta do servidor: {response.text}")
+	print(f"Download concluído: {caminho_zip}")
+	return caminho_zip
+
+def separar_genoma(caminho_zip, genome_id, species_name, max_workers=None):
+	"""Separa os cromossomos do .zip baixado em arquivos .fasta e remove o .zip"""
+	species_dir = os.path.join("data", species_name, "fasta")
+
+	# Separando os cromossomos em arquivos .fasta direto do .zip, sem extrair o .fna
+	print(f"Separando cromossomos do .fna de {species_name}...")
+	with zipfile.ZipFile(caminho_zip, 'r') as zip_ref:
+		membros_fna = [m for m in zip_ref.namelist() if m.startswith(f"ncbi_dataset/data/{genome_id}/") and m.endswith((".fna", ".fa", ".fasta"))]
+	split_fna_files(sorted(membros_fna), os.path.join("data", species_name, f"{species_name}_TER_merged.gff3"), species_dir, max_workers, zip_path=caminho_zip)
+
+	# Removendo o zip; o sidecar de verificação vira o marcador de genoma concluído
+	os.replace(f"{caminho_zip}.sha256", os.path.join(species_dir, f"{genome_id}.done"))
+	os.remove(caminho_zip)
+
+def baixar_fasta(genome_id, species_name):
+	"""Baixa o arquivo FASTA para um genoma Assembly do NCBI."""
+	caminho_zip = baixar_genoma(genome_id, species_name)
+	if caminho_zip:
+		separar_genoma(caminho_zip, genome_id, species_name)
 
 if __name__ == "__main__":
 	if len(sys.argv) != 3:
@@ -1,17 +1,31 @@
 import subprocess
 import os
+import argparse
 import time
 import gc
-from multiprocessing import Pool, cpu_count
 import logging
 import re
+import tempfile
+import sequence_dedup
+import scheduler
+import manifest
+import tracing
+import profiling
 
 Status = {
-	"PROCESSING": -1,
-	"WATING/ERROR": 0,
-	"SUCCESS": 1
+	"PROCESSING": manifest.PROCESSING,
+	"WAITING/ERROR": manifest.WAITING,
+	"SUCCESS": manifest.SUCCESS
 }
 
+# Quantidade de sequências enviadas em cada execução do InterProScan (1 = uma execução por TE)
+BATCH_SIZE = 2000
+
+# Tempo máximo de uma execução do InterProScan (s): fixo + um pouco por sequência do lote. Um lote que
+# trava é dividido ao meio em poucas horas, em vez de prender o worker por 3600 s * sequências
+SEQUENCE_TIMEOUT = 3600
+BATCH_TIMEOUT_PER_SEQUENCE = 10
+
 # Configuração de logs
 logging.basicConfig(
 	filename='extract_domains.log',
@@ -19,49 +33,23 @@ logging.basicConfig(
 	format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Etapa do pipeline no manifesto (o antigo extracted_domains.txt é importado na primeira execução)
+STAGE = "domains"
+
+# Etapa de cada TE no manifesto
+DOMAINS_STEP = "domains"
+
 # Função para ler o status das espécies e adicionar novas espécies com status WAITING/ERROR
 def read_status(status_file, species_list):
-	status = {}
-
-	# Se o arquivo de status não existir, cria um novo com todas as espécies como não processadas (WAITING/ERROR)
-	if not os.path.exists(status_file):
-		with open(status_file, "w") as f:
-			for species in species_list:
-				f.write(f"{species}:{Status["WAITING/ERROR"]}\n")
-				status[species] = Status["WAITING/ERROR"]
-	else:
-		# Se o arquivo existir, lê o status atual
-		with open(status_file, "r") as f:
-			lines = f.readlines()
-			existing_species = set()
-			for line in lines:
-				species, state = line.strip().split(":")
-				status[species] = int(state)
-				existing_species.add(species)
-
-			new_species = set(species_list) - existing_species
-
-			if new_species:
-				with open(status_file, "a") as f:
-					for species in new_species:
-						f.write(f"{species}:{Status["WAITING/ERROR"]}\n")
-						status[species] = Status["WAITING/ERROR"]
-	return status
+	return manifest.species_status(STAGE, species_list, status_file)
 
 # Função para atualizar o status de uma espécie
 def update_status(status_file, species, state):
-	status = {}
-	if os.path.exists(status_file):
-		with open(status_file, "r") as f:
-			for line in f:
-				s, st = line.strip().split(":")
-				status[s] = int(st)
+	manifest.set_species_status(STAGE, species, state)
 
-	status[species] = state
-	
-	with open(status_file, "w") as f:
-		for s, st in status.items():
-			f.write(f"{s}:{st}\n")
+# Espécie de uma pasta data/<espécie>/domains
+def species_of(output_folder):
+	return os.path.basename(os.path.dirname(os.path.normpath(output_folder)))
 
 # Função para processar uma sequência
 def process_sequence(sequence_file, sequences_folder, output_folder, interproscan_path, applications, output_format):
@@ -84,35 +72,157 @@ def process_sequence(sequence_file, sequences_folder, output_folder, interprosca
 	output_species_log = re.sub(regex_pattern, '', output_path)
 
 	try:
-		subprocess.run(command, check=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=3600)
+		with tracing.span("interproscan", "sequence", species=species_of(output_folder), te=sequence_file.replace('.fasta', '')):
+			subprocess.run(command, check=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=SEQUENCE_TIMEOUT)
 
 		# Timer para o cromossomo
 		sequence_end_time = time.time()
+		manifest.record(species_of(output_folder), sequence_file.replace('.fasta', ''), DOMAINS_STEP, manifest.SUCCESS, f"{output_path}.{output_format}", sequence_start_time, sequence_end_time)
 		logging.info(f"Sequência {output_species_log} processada em {sequence_end_time - sequence_start_time:.2f} segundos.")
-	except subprocess.CalledProcessError as e:
-		logging.error(f"Erro ao processar {output_species_log}: {e.stderr}")
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+		# Uma sequência que trava (isolada pela divisão dos lotes) fica com erro, sem derrubar o worker
+		manifest.record(species_of(output_folder), sequence_file.replace('.fasta', ''), DOMAINS_STEP, manifest.WAITING, None, sequence_start_time, time.time())
+		logging.error(f"Erro ao processar {output_species_log}: {e.stderr or e}")
 	finally:
 		gc.collect()  # Liberar memória
 
-# Função para verificar se uma sequência já foi processada (arquivo .tsv existe)
+# Função para processar um lote de sequências em uma única execução do InterProScan
+def process_batch(batch, sequences_folder, output_folder, interproscan_path, applications, output_format):
+	# Lotes unitários (e formatos que não sabemos separar) seguem o caminho individual
+	if len(batch) == 1 or output_format != "tsv":
+		for sequence_file in batch:
+			process_sequence(sequence_file, sequences_folder, output_folder, interproscan_path, applications, output_format)
+		return
+
+	error = run_batch(batch, sequences_folder, output_folder, interproscan_path, applications, output_format)
+	if error is not None and not bisect_batch(batch, error, sequences_folder, output_folder, interproscan_path, applications, output_format):
+		# Falha do ambiente: a tarefa falha e a espécie volta para a fila (scheduler.failures em species_done)
+		raise RuntimeError(f"InterProScan falhou no lote ({batch[0]} ... {batch[-1]}) independentemente das sequências: {error}")
+
+# Divide ao meio um lote que falhou até isolar a sequência problemática. Quando as duas metades falham
+# com o mesmo erro (banco ausente, disco cheio...), a falha não vem de uma sequência: o lote fica com
+# erro sem novas divisões, em vez de custar uma execução do InterProScan por TE. Retorna False nesse caso
+def bisect_batch(batch, error, sequences_folder, output_folder, interproscan_path, applications, output_format):
+	if len(batch) == 1:
+		manifest.record(species_of(output_folder), batch[0].replace('.fasta', ''), DOMAINS_STEP, manifest.WAITING, None, None, time.time())
+		logging.error(f"Erro ao processar {species_of(output_folder)}/{batch[0].replace('.fasta', '')}: {error}")
+		return True
+
+	half = len(batch) // 2
+	halves = [batch[:half], batch[half:]]
+	errors = [run_batch(part, sequences_folder, output_folder, interproscan_path, applications, output_format) for part in halves]
+	if all(errors) and errors[0] == errors[1]:
+		manifest.record_many(species_of(output_folder), [(sequence_file.replace('.fasta', ''), DOMAINS_STEP, manifest.WAITING, None, None, time.time()) for sequence_file in batch])
+		logging.error(f"As duas metades do lote de {len(batch)} sequências ({batch[0]} ... {batch[-1]}) falharam com o mesmo erro; o lote fica com erro, sem novas divisões")
+		return False
+
+	isolated = True
+	for part, part_error in zip(halves, errors):
+		if part_error is not None:
+			isolated = bisect_batch(part, part_error, sequences_folder, output_folder, interproscan_path, applications, output_format) and isolated
+	return isolated
+
+# Texto de um erro do InterProScan sem o que muda entre execuções (pasta temporária, números), para comparar falhas
+def error_text(error, work_dir):
+	if isinstance(error, subprocess.TimeoutExpired):
+		return f"timeout ({SEQUENCE_TIMEOUT} s + {BATCH_TIMEOUT_PER_SEQUENCE} s por sequência)"
+	text = re.sub(r"\d+", "#", (error.stderr or "").replace(work_dir, "<lote>").strip())
+	return f"código {error.returncode}: {text}"
+
+# Executa o InterProScan uma vez para o lote e separa o TSV por sequência. Retorna o texto do erro (error_text), ou None
+def run_batch(batch, sequences_folder, output_folder, interproscan_path, applications, output_format):
+	# Timer para o lote
+	batch_start_time = time.time()
+
+	# Pasta temporária fora de domains/, que só deve conter os .tsv finais
+	with tempfile.TemporaryDirectory(prefix=".interproscan_", dir=os.path.dirname(output_folder)) as work_dir:
+		batch_input = os.path.join(work_dir, "batch.fasta")
+		batch_output = os.path.join(work_dir, "batch")
+
+		# Junta as sequências do lote em um único multi-FASTA
+		with open(batch_input, "w") as out_f:
+			for sequence_file in batch:
+				with open(os.path.join(sequences_folder, sequence_file), "r") as in_f:
+					content = in_f.read()
+				out_f.write(content if content.endswith("\n") else content + "\n")
+
+		command = [
+			interproscan_path,
+			"-i", batch_input,
+			"-appl", ','.join(applications),
+			"-b", batch_output,
+			"-f", output_format
+		]
+
+		try:
+			with tracing.span("interproscan", "batch", species=species_of(output_folder), te=f"{batch[0]} ... {batch[-1]}", sequences=len(batch)):
+				subprocess.run(command, check=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=SEQUENCE_TIMEOUT + BATCH_TIMEOUT_PER_SEQUENCE * len(batch))
+		except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+			logging.error(f"Erro ao processar lote de {len(batch)} sequências ({batch[0]} ... {batch[-1]}): {e.stderr or e}")
+			return error_text(e, work_dir)
+		finally:
+			gc.collect()  # Liberar memória
+
+		# Separa as linhas do TSV por sequência; sequências sem domínio ficam com arquivo vazio
+		hits = {sequence_file.replace('.fasta', ''): [] for sequence_file in batch}
+		with open(f"{batch_output}.{output_format}", "r") as f:
+			for line in f:
+				sequence_name = line.split("\t", 1)[0]
+				if sequence_name not in hits:
+					sequence_name = sequence_name.rsplit("_orf", 1)[0]  # IDs de ORFs em entradas nucleotídicas
+				if sequence_name in hits:
+					hits[sequence_name].append(line)
+
+	rows = []
+	for sequence_name, lines in hits.items():
+		tsv_file = os.path.join(output_folder, f"{sequence_name}.{output_format}")
+		with open(tsv_file, "w") as f:
+			f.writelines(lines)
+		rows.append((sequence_name, DOMAINS_STEP, manifest.SUCCESS, tsv_file, batch_start_time, time.time()))
+
+	# Timer para o lote
+	batch_end_time = time.time()
+	manifest.record_many(species_of(output_folder), rows)
+	logging.info(f"Lote de {len(batch)} sequências ({batch[0]} ... {batch[-1]}) processado em {batch_end_time - batch_start_time:.2f} segundos.")
+	return None
+
+# Função para verificar se uma sequência já foi processada (consulta ao manifesto)
 def is_sequence_processed(sequence_file, domains_folder):
 	sequence_name = sequence_file.replace('.fasta', '')
+	species_name = species_of(domains_folder)
+	done = manifest.is_done(species_name, sequence_name, DOMAINS_STEP)
+	if done is not None:
+		return done
+
+	# Sem registro: .tsv gerado antes do manifesto existir
 	tsv_file = os.path.join(domains_folder, f"{sequence_name}.tsv")
-	return os.path.exists(tsv_file)
+	if os.path.exists(tsv_file):
+		manifest.record(species_name, sequence_name, DOMAINS_STEP, manifest.SUCCESS, tsv_file)
+		return True
+	return False
 
 # Código principal
 if __name__ == "__main__":
-	species_list = sorted(os.listdir("data"))
+	parser = argparse.ArgumentParser(description="Extrai os domínios dos TEs com o InterProScan")
+	profiling.add_arguments(parser)
+	profiling.configure(parser.parse_args(), "extract_domains")
+
 	data_folder = "data"
+	tracing.start()
+	# Ignora arquivos (como o manifesto) e pastas ocultas
+	species_list = sorted(d for d in os.listdir(data_folder) if os.path.isdir(os.path.join(data_folder, d)) and not d.startswith("."))
 	interproscan_path = "./InterProScan/interproscan-5.73-104.0/interproscan.sh"
 	applications = ["PROSITEPATTERNS", "PROSITEPROFILES", "CDD", "PRINTS", "Pfam"]
 	output_format = "tsv"
+	status_file = os.path.join(data_folder, "extracted_domains.txt")  # Antigo; importado para o manifesto
 
+	# Lotes de todas as espécies em uma única fila (os mais longos primeiro), executada por um pool global
+	tasks = []
+	species_duplicates = {}
 	for species_name in species_list:
 		species_folder = os.path.join(data_folder, species_name)
 		os.makedirs(species_folder, exist_ok=True)
 
-		status_file = os.path.join(data_folder, "extracted_domains.txt")
 		status = read_status(status_file, species_list)
 
 		if status.get(species_name, 0) == Status["SUCCESS"] or status.get(species_name, 0) == Status["PROCESSING"]:
@@ -128,24 +238,68 @@ if __name__ == "__main__":
 		os.makedirs(output_folder, exist_ok=True)
 
 		sequences_list = sorted(os.listdir(sequences_folder))
-		num_processes = max(1, cpu_count() // 2)  # Usar metade dos núcleos da CPU
+
+		# Agrupa sequências idênticas: o InterProScan roda apenas para um representante de cada grupo
+		hash_index = sequence_dedup.load_hash_index(sequences_folder, sequences_list)
+		duplicates = sequence_dedup.group_duplicates(sequences_list, hash_index, prefer=lambda seq: is_sequence_processed(seq, output_folder))
 
 		# Lista para armazenar sequências que precisam ser processadas
 		sequences_to_process = []
 
-		# Verifica quais sequências já foram processadas
-		for sequence_file in sequences_list:
+		# Verifica quais sequências já foram processadas (as mais longas primeiro: lotes de tamanho parecido)
+		for sequence_file in sorted(duplicates, key=lambda seq: scheduler.file_cost([os.path.join(sequences_folder, seq)]), reverse=True):
 			if is_sequence_processed(sequence_file, output_folder):
 				logging.info(f"Sequência {sequence_file} já foi processada. Pulando...")
 			else:
 				sequences_to_process.append(sequence_file)
 
 		# Processa apenas as sequências que ainda não foram processadas
-		with Pool(num_processes) as pool:
-			results = pool.starmap(process_sequence, [
-				(seq, sequences_folder, output_folder, interproscan_path, applications, output_format)
+		if BATCH_SIZE > 1:
+			# Lotes menores quando há poucas sequências, para ocupar todos os processos
+			batch_size = max(1, min(BATCH_SIZE, -(-len(sequences_to_process) // scheduler.NUM_PROCESSES)))
+			batches = [sequences_to_process[i:i + batch_size] for i in range(0, len(sequences_to_process), batch_size)]
+			tasks.extend(
+				scheduler.Task(species_name, scheduler.file_cost([os.path.join(sequences_folder, seq) for seq in batch]), process_batch, (batch, sequences_folder, output_folder, interproscan_path, applications, output_format))
+				for batch in batches
+			)
+		else:
+			tasks.extend(
+				scheduler.Task(species_name, scheduler.file_cost([os.path.join(sequences_folder, seq)]), process_sequence, (seq, sequences_folder, output_folder, interproscan_path, applications, output_format))
 				for seq in sequences_to_process
-			])
+			)
+		species_duplicates[species_name] = duplicates
+
+	def species_done(species_name, results):
+		"""Executado no processo principal quando todos os lotes da espécie terminam"""
+		output_folder = os.path.join(data_folder, species_name, "domains")
+		duplicates = species_duplicates[species_name]
 
+		# Replica os domínios de cada representante para as sequências idênticas
+		for representative, copies in duplicates.items():
+			representative_name = representative.replace('.fasta', '')
+			representative_tsv = os.path.join(output_folder, f"{representative_name}.tsv")
+			if not os.path.exists(representative_tsv):
+				continue
+
+			rows = []
+			for sequence_file in copies:
+				if not is_sequence_processed(sequence_file, output_folder):
+					sequence_name = sequence_file.replace('.fasta', '')
+					copy_tsv = os.path.join(output_folder, f"{sequence_name}.tsv")
+					sequence_dedup.fan_out(representative_tsv, copy_tsv, representative_name, sequence_name)
+					rows.append((sequence_name, DOMAINS_STEP, manifest.SUCCESS, copy_tsv, None, time.time()))
+			manifest.record_many(species_name, rows)
+
+		failed = scheduler.failures(results)
+		if failed:
+			update_status(status_file, species_name, Status["WAITING/ERROR"])
+			logging.error(f"Extração de Domínios da {species_name}: {len(failed)} lote(s) falharam; a espécie volta para a fila")
+			return
 		update_status(status_file, species_name, Status["SUCCESS"])
-		logging.info(f"Extração de Domínios da {species_name} Finalizado!")
\ No newline at end of file
+		logging.info(f"Extração de Domínios da {species_name} Finalizado!")
+
+	scheduler.run_tasks(tasks, species_done, groups=species_duplicates)
+	if tracing.finish():
+		logging.info(f"Trace salvo em {tracing.TRACE_FILE}")
+	for report in profiling.finish():
+		logging.info(f"Profile salvo em {report}")
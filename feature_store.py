@@ -0,0 +1,184 @@
+import os
+import uuid
+import pandas as pd
+
+# Store colunar das features: data/<espécie>/features/<operação>[/<variante>]/part-*.parquet
+# Cada escrita gera um novo "part" (workers escrevem em paralelo sem lock); compact() junta os parts.
+STORE_FOLDER = "features"
+
+# Nomes já gravados por dataset: {pasta: (parts já lidos, nomes)}. Parts novos (de outros workers) são
+# lidos na consulta seguinte; se algum part lido sumiu (compactação), o conjunto é refeito do zero
+_stored_names = {}
+
+def _pyarrow():
+	"""Importa o pyarrow sob demanda, com uma mensagem clara quando ele não está instalado"""
+	try:
+		import pyarrow
+		import pyarrow.parquet
+		import pyarrow.dataset
+	except ImportError as e:
+		raise ImportError("O feature store requer o pacote pyarrow (pip install pyarrow)") from e
+	return pyarrow
+
+def feature_dir(data_dir, plant, feature):
+	"""Pasta do dataset de uma feature (ex.: feature = "anf/classic")"""
+	return os.path.join(data_dir, plant, STORE_FOLDER, feature)
+
+def _parts(dataset_dir):
+	if not os.path.isdir(dataset_dir):
+		return []
+	return sorted(os.path.join(dataset_dir, f) for f in os.listdir(dataset_dir) if f.endswith(".parquet"))
+
+def _to_number(values):
+	"""Converte uma coluna para float quando todos os valores são numéricos"""
+	try:
+		return [float(v) for v in values], True
+	except ValueError:
+		return list(values), False
+
+def _table_from_rows(header, rows):
+	"""Monta a tabela de um grupo de linhas CSV com o mesmo cabeçalho.
+
+	Saídas sem cabeçalho (um valor por nucleotídeo) viram nameseq, values (lista) e label."""
+	pa = _pyarrow()
+
+	if header is None:
+		return pa.table({
+			"nameseq": pa.array([row[0] for row in rows], pa.string()),
+			"values": pa.array([[float(v) for v in row[1:-1]] for row in rows], pa.list_(pa.float64())),
+			"label": pa.array([row[-1] for row in rows], pa.string()),
+		})
+
+	columns = {"nameseq": pa.array([row[0] for row in rows], pa.string())}
+	for i, column in enumerate(header[1:], start=1):
+		values, numeric = _to_number([row[i] for row in rows])
+		columns[column] = pa.array(values, pa.float64() if numeric else pa.string())
+	return pa.table(columns)
+
+def _write_part(dataset_dir, table):
+	"""Grava um novo part de forma atômica (leitores nunca veem arquivos pela metade)"""
+	pa = _pyarrow()
+	os.makedirs(dataset_dir, exist_ok=True)
+	part_path = os.path.join(dataset_dir, f"part-{os.getpid()}-{uuid.uuid4().hex}.parquet")
+	pa.parquet.write_table(table, f"{part_path}.tmp")
+	os.replace(f"{part_path}.tmp", part_path)
+
+	cached = _stored_names.get(dataset_dir)
+	if cached is not None:
+		cached[0].add(part_path)
+		cached[1].update(table.column("nameseq").to_pylist())
+	return part_path
+
+def ingest_csv_files(data_dir, plant, feature, csv_paths, remove=True):
+	"""Grava CSVs do MathFeature (um TE por arquivo) no store e, opcionalmente, remove os CSVs"""
+	groups = {}
+	ingested = []
+	for csv_path in csv_paths:
+		with open(csv_path, "r") as f:
+			lines = [line.split(",") for line in f.read().splitlines() if line]
+		if not lines:
+			continue
+
+		header = None
+		if lines[0][0] == "nameseq":
+			header, lines = lines[0], lines[1:]
+		groups.setdefault(tuple(header) if header else None, []).extend(lines)
+		ingested.append(csv_path)
+
+	dataset_dir = feature_dir(data_dir, plant, feature)
+	for header, rows in groups.items():
+		if rows:
+			_write_part(dataset_dir, _table_from_rows(list(header) if header else None, rows))
+
+	if remove:
+		for csv_path in ingested:
+			os.remove(csv_path)
+	return len(ingested)
+
+def stored_names(data_dir, plant, feature):
+	"""Conjunto de TEs já gravados em uma feature (só os parts ainda não vistos pelo processo são lidos)"""
+	dataset_dir = feature_dir(data_dir, plant, feature)
+	parts = _parts(dataset_dir)
+	seen, names = _stored_names.get(dataset_dir, (set(), set()))
+	if not seen.issubset(parts):
+		seen, names = set(), set()
+	new_parts = [part_path for part_path in parts if part_path not in seen]
+	if new_parts:
+		pa = _pyarrow()
+		for part_path in new_parts:
+			names.update(pa.parquet.read_table(part_path, columns=["nameseq"]).column("nameseq").to_pylist())
+		seen.update(new_parts)
+	_stored_names[dataset_dir] = (seen, names)
+	return names
+
+def contains(data_dir, plant, feature, name):
+	"""Verifica se um TE já tem a feature gravada no store"""
+	return name in stored_names(data_dir, plant, feature)
+
+def _read_table(data_dir, plant, feature, names=None, columns=None):
+	pa = _pyarrow()
+	parts = _parts(feature_dir(data_dir, plant, feature))
+	if not parts:
+		return None
+	dataset = pa.dataset.dataset(parts, format="parquet")
+
+	if columns is not None:
+		columns = ["nameseq"] + [c for c in columns if c != "nameseq"]
+	row_filter = None
+	if names is not None:
+		row_filter = pa.dataset.field("nameseq").isin(list(names))
+
+	return dataset.to_table(columns=columns, filter=row_filter)
+
+def read_features(data_dir, plant, feature, names=None, columns=None):
+	"""Lê uma feature como DataFrame, opcionalmente só algumas linhas (TEs) e colunas"""
+	table = _read_table(data_dir, plant, feature, names, columns)
+	if table is None:
+		return pd.DataFrame(columns=["nameseq"])
+	return table.to_pandas()
+
+def _last_rows(table):
+	"""Índice da última linha de cada TE em uma tabela"""
+	return {name: i for i, name in enumerate(table.column("nameseq").to_pylist())}
+
+def copy_rows(data_dir, plant, feature, duplicates):
+	"""Replica as linhas de representantes para cópias idênticas: duplicates = {representante: [cópias]}"""
+	pa = _pyarrow()
+	already_stored = stored_names(data_dir, plant, feature)
+	pending = {}
+	for representative, copies in duplicates.items():
+		copies = [c for c in copies if c not in already_stored]
+		if representative in already_stored and copies:
+			pending[representative] = copies
+	if not pending:
+		return 0
+
+	table = _read_table(data_dir, plant, feature, names=pending)
+	last_rows = _last_rows(table)
+	indices, names = [], []
+	for representative, copies in pending.items():
+		indices.extend([last_rows[representative]] * len(copies))
+		names.extend(copies)
+
+	rows = table.take(indices)
+	column = rows.schema.get_field_index("nameseq")
+	rows = rows.set_column(column, rows.schema.field(column), pa.array(names, rows.schema.field(column).type))
+	_write_part(feature_dir(data_dir, plant, feature), rows)
+	return len(names)
+
+def compact(data_dir, plant, feature):
+	"""Junta todos os parts de uma feature em um único arquivo, mantendo a última versão de cada TE"""
+	pa = _pyarrow()
+	dataset_dir = feature_dir(data_dir, plant, feature)
+	parts = _parts(dataset_dir)
+	if len(parts) <= 1:
+		return
+
+	table = pa.concat_tables([pa.parquet.read_table(p) for p in parts], promote_options="default")
+	last_rows = _last_rows(table)
+	table = table.take([last_rows[name] for name in sorted(last_rows)])
+
+	_write_part(dataset_dir, table)
+	for part_path in parts:
+		os.remove(part_path)
+	_stored_names.pop(dataset_dir, None)
@@ -0,0 +1,98 @@
+import os
+import mmap
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Uma linha do índice .fai (mesmo formato do `samtools faidx`)
+FaiEntry = namedtuple("FaiEntry", ["name", "length", "offset", "line_bases", "line_width"])
+
+def build_index(fasta_path):
+	"""Percorre o FASTA uma única vez e grava o índice <fasta>.fai ao lado dele"""
+	entries = []
+	name = None
+
+	def close_record():
+		if name is not None:
+			entries.append(FaiEntry(name, length, offset, line_bases, line_width))
+
+	with open(fasta_path, "rb") as f:
+		position = 0
+		last_line_short = False
+		for line in f:
+			if line.startswith(b">"):
+				close_record()
+				name = line[1:].split()[0].decode() if line[1:].split() else ""
+				length, offset, line_bases, line_width = 0, position + len(line), 0, 0
+				last_line_short = False
+			elif name is not None:
+				bases = len(line.rstrip(b"\r\n"))
+				if line_bases == 0:
+					line_bases, line_width = bases, len(line)
+				elif last_line_short or bases > line_bases:
+					raise ValueError(f"Linhas de tamanho irregular em {fasta_path} ({name}); não é possível indexar")
+				last_line_short = bases < line_bases
+				length += bases
+			position += len(line)
+		close_record()
+
+	# Escrita atômica: outro processo nunca lê um índice pela metade
+	tmp_path = f"{fasta_path}.fai.{os.getpid()}.tmp"
+	with open(tmp_path, "w") as f:
+		for entry in entries:
+			f.write("\t".join(str(value) for value in entry) + "\n")
+	os.replace(tmp_path, f"{fasta_path}.fai")
+	return entries
+
+def load_index(fasta_path):
+	"""Lê o índice .fai, (re)construindo-o quando não existe ou é mais antigo que o FASTA"""
+	fai_path = f"{fasta_path}.fai"
+	if not os.path.exists(fai_path) or os.path.getmtime(fai_path) < os.path.getmtime(fasta_path):
+		entries = build_index(fasta_path)
+	else:
+		entries = []
+		with open(fai_path, "r") as f:
+			for line in f:
+				name, *values = line.rstrip("\n").split("\t")
+				entries.append(FaiEntry(name, *(int(v) for v in values[:4])))
+	return {entry.name: entry for entry in entries}
+
+def read_sequence(fasta_path):
+	"""Lê o primeiro registro inteiro em memória (FASTAs com linhas irregulares, que não podem ser indexados).
+
+	Retorna (entrada, sequência) no formato usado por fetch, como um registro de uma única linha"""
+	name, chunks = None, []
+	with open(fasta_path, "rb") as f:
+		for line in f:
+			if line.startswith(b">"):
+				if name is not None:
+					break
+				name = line[1:].split()[0].decode() if line[1:].split() else ""
+			elif name is not None:
+				chunks.append(line.strip())
+	if name is None:
+		return None, b""
+	sequence = b"".join(chunks)
+	return FaiEntry(name, len(sequence), 0, max(len(sequence), 1), max(len(sequence), 1)), sequence
+
+@contextmanager
+def mapped_fasta(fasta_path):
+	"""Mapeia o FASTA em memória (somente leitura); as páginas são compartilhadas entre processos"""
+	with open(fasta_path, "rb") as f:
+		if os.fstat(f.fileno()).st_size == 0:
+			yield b""
+			return
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+			yield mapped
+
+def fetch(mapped, entry, start, end):
+	"""Extrai a subsequência [start, end] (1-based, inclusiva, como no GFF3) sem carregar o cromossomo"""
+	start = max(start, 1)
+	end = min(end, entry.length)
+	if start > end:
+		return ""
+
+	def byte_offset(position):  # posição 0-based -> deslocamento no arquivo
+		return entry.offset + (position // entry.line_bases) * entry.line_width + position % entry.line_bases
+
+	chunk = mapped[byte_offset(start - 1):byte_offset(end - 1) + 1]
+	return chunk.replace(b"\n", b"").replace(b"\r", b"").decode()
@@ -0,0 +1,212 @@
+import os
+import heapq
+import tempfile
+from array import array
+from collections import namedtuple
+from urllib.parse import unquote
+import numpy as np
+
+# Linhas de anotação mantidas em memória por bloco ordenado (o resto fica em arquivos temporários)
+SORT_BUFFER_LINES = 500_000
+
+# Chaves de Attributes que trazem a classe do TE (na falta delas, usa-se a coluna type)
+CLASS_ATTRIBUTES = ("Classification", "classification", "Class", "class")
+CLASS_PATTERN = r"(?:^|;)\s*(?:%s)\s*=(?P<label>[^;\r\n]+)" % "|".join(CLASS_ATTRIBUTES)
+
+# Colunas do GFF3 e tamanho dos blocos lidos pelo pyarrow
+GFF3_COLUMNS = ["seqid", "source", "type", "start", "end", "score", "strand", "phase", "attributes"]
+READ_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Intervalos de um seqid, ordenados por (start, end); class_codes indexa a lista de classes
+Intervals = namedtuple("Intervals", ["starts", "ends", "class_codes"])
+
+
+def feature_key(line):
+	"""Chave de ordenação de uma linha de anotação: (seqid, start, end, linha).
+
+	A própria linha desempata, deixando linhas idênticas lado a lado e a saída determinística."""
+	fields = line.split("\t", 5)
+	return fields[0], int(fields[3]), int(fields[4]), line
+
+def _write_run(lines, tmp_dir, runs):
+	"""Ordena um bloco de linhas e grava-o como um arquivo temporário (run)"""
+	lines.sort(key=feature_key)
+	fd, run_path = tempfile.mkstemp(suffix=".gff3", dir=tmp_dir)
+	with os.fdopen(fd, "w") as f:
+		f.writelines(lines)
+	runs.append(run_path)
+	lines.clear()
+
+def _read_run(run_path):
+	with open(run_path, "r") as f:
+		yield from f
+
+def sorted_runs(input_files, tmp_dir, header, buffer_lines=SORT_BUFFER_LINES):
+	"""Lê os .gff3 em blocos de até buffer_lines linhas e grava cada bloco ordenado em tmp_dir.
+
+	As diretivas/comentários (#) vão para `header`, sem repetição; linhas malformadas são descartadas."""
+	runs, lines = [], []
+	seen_header = set(header)
+	skipped = 0
+	for input_file in input_files:
+		with open(input_file, "r") as in_f:
+			for line in in_f:
+				if not line.strip():
+					continue
+				if line.startswith("#"):
+					if line.startswith("##FASTA"):
+						break  # Sequências embutidas no fim do arquivo não são anotações
+					line = line.rstrip("\r\n") + "\n"
+					if line.startswith("##gff-version") and any(h.startswith("##gff-version") for h in header):
+						continue  # Uma única versão, a do primeiro arquivo
+					if line != "###\n" and line not in seen_header:  # ### só faz sentido na ordem original
+						seen_header.add(line)
+						header.append(line)
+					continue
+
+				line = line.rstrip("\r\n") + "\n"
+				try:
+					feature_key(line)
+				except (IndexError, ValueError):
+					skipped += 1
+					continue
+				lines.append(line)
+				if len(lines) >= buffer_lines:
+					_write_run(lines, tmp_dir, runs)
+	if lines:
+		_write_run(lines, tmp_dir, runs)
+	return runs, skipped
+
+def merge_sorted(input_files, output_file, buffer_lines=SORT_BUFFER_LINES):
+	"""Junta vários .gff3 em um único arquivo ordenado por (seqid, start, end), sem linhas repetidas.
+
+	Usa ordenação externa (memória limitada a buffer_lines linhas) e um merge k-way dos blocos.
+	Retorna (linhas escritas, duplicatas removidas, linhas malformadas descartadas)."""
+	output_dir = os.path.dirname(os.path.abspath(output_file))
+	written = duplicates = 0
+
+	with tempfile.TemporaryDirectory(dir=output_dir, prefix=".gff3_sort_") as tmp_dir:
+		header = []
+		runs, skipped = sorted_runs(input_files, tmp_dir, header, buffer_lines)
+
+		# ##gff-version precisa ser a primeira linha do arquivo
+		header.sort(key=lambda line: not line.startswith("##gff-version"))
+
+		with open(output_file, "w") as out_f:
+			out_f.writelines(header)
+			previous = None
+			for line in heapq.merge(*(_read_run(run) for run in runs), key=feature_key):
+				if line == previous:
+					duplicates += 1
+					continue
+				out_f.write(line)
+				previous = line
+				written += 1
+
+	return written, duplicates, skipped
+
+def class_label(fields):
+	"""Classe de uma anotação: atributo de CLASS_ATTRIBUTES ou, na falta dele, a coluna type"""
+	if len(fields) > 8:
+		for item in fields[8].rstrip("\r\n").split(";"):
+			key, _, value = item.partition("=")
+			if value and key.strip() in CLASS_ATTRIBUTES:
+				return value
+	return fields[2]
+
+def _normalized_label(label):
+	return unquote(label.strip())
+
+def _codes(values, codes):
+	"""Códigos globais (0, 1, ...) de uma coluna categórica, na ordem de primeira ocorrência"""
+	return np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int32)
+
+def _read_columns_arrow(gff3_path, seqid_codes, class_codes):
+	"""Lê as colunas em blocos com o leitor CSV do pyarrow (C++, multithread) e a classe com RE2"""
+	import pyarrow as pa
+	import pyarrow.csv
+	import pyarrow.compute as pc
+
+	reader = pa.csv.open_csv(
+		gff3_path,
+		read_options=pa.csv.ReadOptions(column_names=GFF3_COLUMNS, block_size=READ_BLOCK_SIZE),
+		# Comentários e diretivas têm uma única coluna: são linhas inválidas, descartadas
+		parse_options=pa.csv.ParseOptions(delimiter="\t", quote_char=False, invalid_row_handler=lambda row: "skip"),
+		convert_options=pa.csv.ConvertOptions(
+			include_columns=["seqid", "type", "start", "end", "attributes"],
+			column_types={"seqid": pa.string(), "type": pa.string(), "start": pa.int64(), "end": pa.int64(), "attributes": pa.string()},
+		),
+	)
+	for batch in reader:
+		labels = pc.coalesce(pc.extract_regex(batch.column("attributes"), CLASS_PATTERN).field("label"), batch.column("type"))
+
+		# Os valores distintos são poucos: a normalização e o mapeamento para códigos globais são feitos sobre o dicionário
+		seqids = pc.dictionary_encode(batch.column("seqid"))
+		labels = pc.dictionary_encode(labels)
+		yield (
+			_codes(seqids.dictionary.to_pylist(), seqid_codes)[seqids.indices.to_numpy()],
+			batch.column("start").to_numpy(),
+			batch.column("end").to_numpy(),
+			_codes([_normalized_label(v) for v in labels.dictionary.to_pylist()], class_codes)[labels.indices.to_numpy()],
+		)
+
+def _read_columns_python(gff3_path, seqid_codes, class_codes):
+	"""Lê as colunas linha a linha, em arrays tipados (usado quando o pyarrow não está instalado)"""
+	seqids, starts, ends, classes = array("i"), array("q"), array("q"), array("i")
+	labels = {}
+	with open(gff3_path, "r") as f:
+		for line in f:
+			if line.startswith("#"):
+				if line.startswith("##FASTA"):
+					break
+				continue
+			fields = line.split("\t", 8)
+			if len(fields) < 9:
+				continue  # Linha vazia ou malformada
+
+			seqid = seqid_codes.get(fields[0])
+			if seqid is None:
+				seqid = seqid_codes[fields[0]] = len(seqid_codes)
+			label = class_label(fields)
+			code = labels.get(label)
+			if code is None:
+				code = labels[label] = class_codes.setdefault(_normalized_label(label), len(class_codes))
+
+			seqids.append(seqid)
+			starts.append(int(fields[3]))
+			ends.append(int(fields[4]))
+			classes.append(code)
+
+	yield tuple(np.frombuffer(column, dtype=dtype) for column, dtype in zip((seqids, starts, ends, classes), (np.int32, np.int64, np.int64, np.int32)))
+
+def read_intervals(gff3_path):
+	"""Lê um .gff3 em streaming e retorna ({seqid: Intervals}, classes).
+
+	Guarda só seqid, start, end e classe de cada anotação, em arrays NumPy (4 + 8 + 8 + 4 bytes por linha);
+	as classes vêm codificadas (class_codes indexa a lista `classes`)."""
+	seqid_codes, class_codes = {}, {}
+	try:
+		import pyarrow.csv  # noqa: F401
+		read_columns = _read_columns_arrow
+	except ImportError:
+		read_columns = _read_columns_python
+
+	blocks = list(read_columns(gff3_path, seqid_codes, class_codes))
+	if not blocks:
+		return {}, list(class_codes)
+	seqids, starts, ends, classes = (np.concatenate(column) for column in zip(*blocks))
+	del blocks
+
+	# Ordena por (seqid, start, end) e corta um bloco contíguo por seqid; arquivos de merge_sorted já vêm ordenados
+	ordered = (seqids[1:] > seqids[:-1]) | ((seqids[1:] == seqids[:-1]) & ((starts[1:] > starts[:-1]) | ((starts[1:] == starts[:-1]) & (ends[1:] >= ends[:-1]))))
+	if not ordered.all():
+		order = np.lexsort((ends, starts, seqids))
+		seqids, starts, ends, classes = seqids[order], starts[order], ends[order], classes[order]
+	del ordered
+	bounds = np.searchsorted(seqids, np.arange(len(seqid_codes) + 1))
+
+	intervals = {}
+	for seqid, code in sorted(seqid_codes.items()):
+		begin, end = bounds[code], bounds[code + 1]
+		intervals[seqid] = Intervals(starts[begin:end], ends[begin:end], classes[begin:end])
+	return intervals, list(class_codes)
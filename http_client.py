@@ -0,0 +1,197 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+# Conexões simultâneas permitidas por servidor (NCBI e APTE limitam clientes agressivos)
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get("MAX_CONNECTIONS_PER_HOST", 4))
+
+# Tamanho dos blocos gravados em disco durante os downloads
+CHUNK_SIZE = 1024 * 1024
+
+# Quantas vezes um download interrompido é retomado (Range) antes de desistir
+RESUME_ATTEMPTS = 5
+
+# Resultado de download_file: ok indica arquivo completo e verificado
+DownloadResult = namedtuple("DownloadResult", ["ok", "status_code", "text"])
+
+# Cache em disco das respostas de get() (páginas e APIs), revalidado com ETag/Last-Modified.
+# Fica fora de data/, onde cada pasta é tratada como uma espécie
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", ".http_cache")
+
+# Modo offline: get() responde só com o cache e download_file() só aceita arquivos já verificados
+OFFLINE = os.environ.get("HTTP_OFFLINE", "0") == "1"
+
+_session = None
+_session_lock = threading.Lock()
+_host_semaphores = {}
+
+def get_session():
+	"""Sessão HTTP compartilhada pelas threads do processo (keep-alive e pool de conexões por servidor)"""
+	global _session
+	with _session_lock:
+		if _session is None:
+			retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET", "HEAD"], raise_on_status=False)
+			adapter = HTTPAdapter(pool_connections=16, pool_maxsize=MAX_CONNECTIONS_PER_HOST, max_retries=retries)
+			session = requests.Session()
+			session.mount("http://", adapter)
+			session.mount("https://", adapter)
+			_session = session
+		return _session
+
+@contextmanager
+def host_slot(url):
+	"""Limita o número de requisições simultâneas a um mesmo servidor"""
+	host = urlsplit(url).netloc
+	with _session_lock:
+		semaphore = _host_semaphores.setdefault(host, threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST))
+	with semaphore:
+		yield
+
+def _cache_paths(url, params):
+	"""Arquivos do cache de uma URL (a chave é a URL completa, com os parâmetros)"""
+	full_url = requests.Request("GET", url, params=params).prepare().url
+	key = hashlib.sha1(full_url.encode()).hexdigest()
+	return full_url, os.path.join(CACHE_DIR, f"{key}.json"), os.path.join(CACHE_DIR, f"{key}.body")
+
+def _cached_response(full_url, meta_path, body_path):
+	"""Reconstrói a resposta gravada no cache, ou None"""
+	if not os.path.exists(meta_path) or not os.path.exists(body_path):
+		return None
+	with open(meta_path, "r") as f:
+		meta = json.load(f)
+	response = requests.Response()
+	response.url = full_url
+	response.status_code = meta["status_code"]
+	response.headers = CaseInsensitiveDict(meta["headers"])
+	response.encoding = meta.get("encoding")
+	with open(body_path, "rb") as f:
+		response._content = f.read()
+	return response
+
+def _store_response(response, meta_path, body_path):
+	"""Grava corpo e metadados de forma atômica (threads e processos podem gravar a mesma URL)"""
+	os.makedirs(CACHE_DIR, exist_ok=True)
+	headers = {k: v for k, v in response.headers.items() if k.lower() in ("etag", "last-modified", "content-type")}
+	for path, data, mode in ((body_path, response.content, "wb"), (meta_path, json.dumps({"url": response.url, "status_code": response.status_code, "headers": headers, "encoding": response.encoding}), "w")):
+		tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+		with open(tmp_path, mode) as f:
+			f.write(data)
+		os.replace(tmp_path, path)
+
+def get(url, params=None, **kwargs):
+	"""GET pela sessão compartilhada, com cache em disco revalidado por ETag/Last-Modified.
+
+	Respostas 200 ficam no cache; com o servidor inacessível (ou em modo offline) o cache é reaproveitado."""
+	full_url, meta_path, body_path = _cache_paths(url, params)
+	cached = _cached_response(full_url, meta_path, body_path)
+	if OFFLINE:
+		if cached is None:
+			raise requests.exceptions.ConnectionError(f"Modo offline: {full_url} não está no cache")
+		return cached
+
+	headers = dict(kwargs.pop("headers", None) or {})
+	if cached is not None:
+		if "ETag" in cached.headers:
+			headers["If-None-Match"] = cached.headers["ETag"]
+		if "Last-Modified" in cached.headers:
+			headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+	try:
+		with host_slot(url):
+			response = get_session().get(url, params=params, headers=headers, **kwargs)
+			response.content
+	except requests.exceptions.RequestException as e:
+		if cached is None:
+			raise
+		print(f"Falha ao acessar {full_url} ({e}); usando a resposta em cache")
+		return cached
+
+	if response.status_code == 304 and cached is not None:
+		return cached
+	if response.status_code == 200:
+		_store_response(response, meta_path, body_path)
+	return response
+
+def _file_sha256(file_path):
+	digest = hashlib.sha256()
+	with open(file_path, "rb") as f:
+		for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+			digest.update(chunk)
+	return digest
+
+def _total_size(response, offset):
+	"""Tamanho total esperado do arquivo (Content-Range em 206, Content-Length em 200), ou None"""
+	if response.status_code == 206:
+		total = response.headers.get("Content-Range", "").rpartition("/")[2]
+		return int(total) if total.isdigit() else None
+	length = response.headers.get("Content-Length")
+	return int(length) if length and length.isdigit() and "Content-Encoding" not in response.headers else None
+
+def is_verified(file_path):
+	"""Verifica se o arquivo já foi baixado e verificado (sidecar <arquivo>.sha256 com o mesmo tamanho)"""
+	sidecar = f"{file_path}.sha256"
+	if not os.path.exists(file_path) or not os.path.exists(sidecar):
+		return False
+	with open(sidecar, "r") as f:
+		fields = f.read().split()
+	return len(fields) == 2 and fields[1] == str(os.path.getsize(file_path))
+
+def download_file(url, file_path, params=None, expected_sha256=None, verify=None):
+	"""Baixa uma URL direto para o disco, em blocos, retomando de <arquivo>.part com Range quando a conexão cai.
+
+	O arquivo só ganha o nome final depois de conferidos o tamanho (Content-Length/Content-Range), o
+	sha256 esperado e a função verify(caminho) opcional; o sidecar <arquivo>.sha256 marca o download
+	como verificado e faz com que ele seja pulado nas próximas execuções."""
+	if is_verified(file_path):
+		return DownloadResult(True, 200, "")
+	if OFFLINE:
+		return DownloadResult(False, None, f"Modo offline: {url} não foi baixado anteriormente")
+
+	part_path = f"{file_path}.part"
+	status_code, text = None, ""
+	for attempt in range(RESUME_ATTEMPTS):
+		offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+		headers = {"Range": f"bytes={offset}-"} if offset else {}
+		try:
+			with host_slot(url), get_session().get(url, params=params, headers=headers, stream=True) as response:
+				status_code = response.status_code
+				if status_code == 416:  # O .part já tem todos os bytes (ou está corrompido)
+					total = response.headers.get("Content-Range", "").rpartition("/")[2]
+					if total != str(offset):
+						os.remove(part_path)
+						continue
+				elif status_code in (200, 206):
+					total = _total_size(response, offset)
+					with open(part_path, "ab" if status_code == 206 else "wb") as f:
+						for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+							f.write(chunk)
+					if total is not None and os.path.getsize(part_path) != total:
+						continue  # Conexão encerrada antes do fim: retoma do ponto atual
+				else:
+					text = response.text  # Mensagem de erro do servidor
+					return DownloadResult(False, status_code, text)
+		except requests.exceptions.RequestException as e:
+			text = str(e)
+			continue
+
+		digest = _file_sha256(part_path).hexdigest()
+		if (expected_sha256 and digest != expected_sha256.lower()) or (verify and not verify(part_path)):
+			os.remove(part_path)  # Conteúdo inválido: não há o que retomar
+			return DownloadResult(False, status_code, f"Falha na verificação de {url}")
+
+		with open(f"{file_path}.sha256", "w") as f:
+			f.write(f"{digest} {os.path.getsize(part_path)}\n")
+		os.replace(part_path, file_path)
+		return DownloadResult(True, status_code, "")
+
+	return DownloadResult(False, status_code, text or f"Download incompleto após {RESUME_ATTEMPTS} tentativas: {url}")
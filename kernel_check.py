@@ -0,0 +1,113 @@
+import os
+import sys
+import random
+import argparse
+import tempfile
+import mathfeature_kernels
+import mathfeature_processing as mfp
+
+# Confere os kernels NumPy de mathfeature_kernels com os CSVs já gravados pelo MathFeature em
+# data/<espécie>/<operação>/...: a saída do kernel precisa ser idêntica byte a byte. Confere também os que
+# ainda não estão em mathfeature_processing.NATIVE_KERNELS, que só devem ser ligados depois de passar aqui.
+# Chamadas que o kernel recusa (e que por isso continuam com o script) não contam como divergência.
+
+def rebuild_anf_sequence(values):
+	"""Uma sequência com exatamente esse ANF classic: a frequência na posição i fixa quantas vezes o
+	nucleotídeo de i aparece em s[:i+1]. Nucleotídeos empatados são intercambiáveis para o ANF"""
+	counts = [0] * len(mathfeature_kernels.NUCLEOTIDES)
+	seq = []
+	for i, value in enumerate(values):
+		count = round(value * (i + 1))
+		code = next((code for code, seen in enumerate(counts) if seen + 1 == count), None)
+		if code is None:
+			return None
+		counts[code] += 1
+		seq.append(mathfeature_kernels.NUCLEOTIDES[code])
+	return "".join(seq)
+
+def kernel_input(plant, seq_name, operation, work_dir):
+	"""FASTA de entrada da operação: o pré-processado ou, para o ANF, um reconstruído do ANF classic gravado"""
+	preprocessed = mfp.operation_output_file(plant, seq_name)
+	if os.path.exists(preprocessed) and os.path.getsize(preprocessed) > 0:
+		return preprocessed
+	if operation != "anf":
+		return None
+
+	classic = mfp.operation_output_file(plant, seq_name, "anf", 1)
+	if not os.path.exists(classic):
+		return None
+	with open(classic, "r") as f:
+		fields = f.readline().rstrip("\n").split(",")
+	seq = rebuild_anf_sequence([float(value) for value in fields[1:-1]])
+	if seq is None:
+		return None
+	fasta_path = os.path.join(work_dir, seq_name)
+	with open(fasta_path, "w") as f:
+		f.write(f">{fields[0]}\n{seq}\n")
+	return fasta_path
+
+def check_operation(plant, operation, num, sample=None):
+	"""Compara a saída do kernel com os CSVs gravados de uma operação. Retorna {situação: quantidade} e as divergências"""
+	summary = {"identical": 0, "different": 0, "declined": 0, "no_input": 0}
+	different = []
+	output_file = mfp.operation_output_file(plant, "", operation, num)
+	output_dir, suffix = os.path.dirname(output_file), os.path.basename(output_file)
+	if not os.path.isdir(output_dir):
+		return summary, different
+
+	stored = sorted(f for f in os.listdir(output_dir) if f.endswith(suffix))
+	if sample is not None and len(stored) > sample:
+		stored = sorted(random.sample(stored, sample))
+
+	for stored_file in stored:
+		seq_name = f"{stored_file[:-len(suffix)]}.fasta"
+		with tempfile.TemporaryDirectory(prefix=".kernel_check_") as work_dir:
+			seq_path = kernel_input(plant, seq_name, operation, work_dir)
+			if seq_path is None:
+				summary["no_input"] += 1
+				continue
+
+			kernel_output = os.path.join(work_dir, "kernel.csv")
+			script, args, stdin_text = mfp.operation_command(operation, num, seq_path, kernel_output)
+			if not mathfeature_kernels.run_native(script, args, stdin_text):
+				summary["declined"] += 1
+				continue
+
+			with open(kernel_output, "rb") as f:
+				produced = f.read()
+			with open(os.path.join(output_dir, stored_file), "rb") as f:
+				expected = f.read()
+
+		if produced == expected:
+			summary["identical"] += 1
+		else:
+			summary["different"] += 1
+			different.append(os.path.join(output_dir, stored_file))
+	return summary, different
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Confere a saída dos kernels NumPy com os CSVs gravados pelo MathFeature")
+	parser.add_argument("--sample", type=int, default=None, help="Máximo de CSVs conferidos por operação e espécie (sorteados)")
+	parser.add_argument("--seed", type=int, default=1, help="Semente do sorteio de --sample")
+	args = parser.parse_args()
+	random.seed(args.seed)
+
+	failed = False
+	species_list = sorted(d for d in os.listdir(mfp.DATA_DIR) if os.path.isdir(os.path.join(mfp.DATA_DIR, d)) and not d.startswith("."))
+	for plant in species_list:
+		for operation, num in mfp.OPERATIONS:
+			script = mfp.operation_command(operation, num, "", "")[0]
+			if os.path.basename(script) not in mathfeature_kernels.NATIVE_SCRIPTS:
+				continue
+
+			summary, different = check_operation(plant, operation, num, args.sample)
+			if not any(summary.values()):
+				continue
+			state = "ligado" if os.path.basename(script) in mfp.NATIVE_KERNELS else "desligado"
+			print(f"{plant} {mfp.operation_step(operation, num)} ({state}): {summary['identical']} idênticos, {summary['different']} divergentes, "
+				f"{summary['declined']} com o script, {summary['no_input']} sem entrada")
+			for path in different[:10]:
+				print(f"  divergente: {path}")
+			failed = failed or bool(different)
+
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,135 @@
+import os
+import time
+import sqlite3
+import threading
+
+# Estado do pipeline (por TE e por espécie) em um único SQLite em modo WAL: leituras não bloqueiam e
+# os workers gravam concorrentemente, cada escrita em uma transação curta
+MANIFEST_PATH = os.environ.get("MANIFEST_PATH", os.path.join("data", "manifest.sqlite"))
+
+# Tempo máximo de espera por outro processo que esteja gravando (ms)
+BUSY_TIMEOUT = 60000
+
+# Estados (os mesmos códigos dos antigos status.txt/extracted_domains.txt)
+PROCESSING = -1
+WAITING = 0  # Aguardando ou com erro
+SUCCESS = 1
+
+# Máximo de parâmetros por consulta IN (...)
+QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS steps (
+	species TEXT NOT NULL,
+	item TEXT NOT NULL,
+	step TEXT NOT NULL,
+	state INTEGER NOT NULL,
+	output TEXT,
+	started REAL,
+	finished REAL,
+	PRIMARY KEY (species, item, step)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS species (
+	stage TEXT NOT NULL,
+	species TEXT NOT NULL,
+	state INTEGER NOT NULL,
+	updated REAL,
+	PRIMARY KEY (stage, species)
+) WITHOUT ROWID;
+"""
+
+_local = threading.local()
+
+def connect():
+	"""Conexão do processo/thread atual (conexões SQLite não podem atravessar um fork)"""
+	if getattr(_local, "pid", None) != os.getpid():
+		directory = os.path.dirname(MANIFEST_PATH)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		connection = sqlite3.connect(MANIFEST_PATH, timeout=BUSY_TIMEOUT / 1000)
+		connection.execute("PRAGMA journal_mode=WAL")
+		connection.execute("PRAGMA synchronous=NORMAL")
+		connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT}")
+		connection.executescript(SCHEMA)
+		_local.pid, _local.connection = os.getpid(), connection
+	return _local.connection
+
+def record(species, item, step, state, output=None, started=None, finished=None):
+	"""Grava o estado de uma etapa de um TE"""
+	record_many(species, [(item, step, state, output, started, finished)])
+
+def record_many(species, rows):
+	"""Grava várias etapas em uma única transação: rows = [(item, etapa, estado, saída, início, fim)]"""
+	connection = connect()
+	with connection:
+		connection.executemany(
+			"INSERT OR REPLACE INTO steps (species, item, step, state, output, started, finished) VALUES (?, ?, ?, ?, ?, ?, ?)",
+			[(species, *row) for row in rows],
+		)
+
+def is_done(species, item, step):
+	"""Verifica se a etapa do TE terminou com sucesso. Retorna None quando não há registro"""
+	row = connect().execute("SELECT state FROM steps WHERE species = ? AND item = ? AND step = ?", (species, item, step)).fetchone()
+	return None if row is None else row[0] == SUCCESS
+
+def completed_steps(species, items):
+	"""Etapas concluídas de vários TEs: {item: {etapas}}, com uma consulta indexada por bloco de itens"""
+	items = list(items)
+	completed = {item: set() for item in items}
+	connection = connect()
+	for i in range(0, len(items), QUERY_CHUNK):
+		chunk = items[i:i + QUERY_CHUNK]
+		rows = connection.execute(
+			f"SELECT item, step FROM steps WHERE species = ? AND state = ? AND item IN ({','.join('?' * len(chunk))})",
+			(species, SUCCESS, *chunk),
+		)
+		for item, step in rows:
+			completed[item].add(step)
+	return completed
+
+def recorded_steps(species):
+	"""Pares (item, etapa) da espécie que já têm registro, em qualquer estado"""
+	return set(connect().execute("SELECT item, step FROM steps WHERE species = ?", (species,)).fetchall())
+
+def completed_items(species, step, prefix=""):
+	"""TEs da espécie (opcionalmente só os com um prefixo, ex.: um cromossomo) com a etapa concluída"""
+	rows = connect().execute(
+		"SELECT item FROM steps WHERE species = ? AND item >= ? AND item < ? AND step = ? AND state = ?",
+		(species, prefix, prefix + "\U0010ffff", step, SUCCESS),
+	)
+	return {item for item, in rows}
+
+def _import_status_file(stage, status_file):
+	"""Importa um arquivo de status antigo (espécie:estado por linha), uma única vez"""
+	if not status_file or not os.path.exists(status_file):
+		return
+	rows = []
+	with open(status_file, "r") as f:
+		for line in f:
+			species, _, state = line.strip().rpartition(":")
+			if species and state.lstrip("-").isdigit():
+				rows.append((stage, species, int(state), time.time()))
+	connection = connect()
+	with connection:
+		connection.executemany("INSERT OR IGNORE INTO species (stage, species, state, updated) VALUES (?, ?, ?, ?)", rows)
+
+def species_status(stage, species_list, legacy_status_file=None):
+	"""Estado de cada espécie em uma etapa do pipeline; espécies novas entram como WAITING"""
+	connection = connect()
+	if connection.execute("SELECT 1 FROM species WHERE stage = ? LIMIT 1", (stage,)).fetchone() is None:
+		_import_status_file(stage, legacy_status_file)
+	with connection:
+		connection.executemany(
+			"INSERT OR IGNORE INTO species (stage, species, state, updated) VALUES (?, ?, ?, ?)",
+			[(stage, species, WAITING, time.time()) for species in species_list],
+		)
+	return dict(connection.execute("SELECT species, state FROM species WHERE stage = ?", (stage,)).fetchall())
+
+def set_species_status(stage, species, state):
+	"""Atualiza o estado de uma espécie em uma etapa"""
+	connection = connect()
+	with connection:
+		connection.execute(
+			"INSERT OR REPLACE INTO species (stage, species, state, updated) VALUES (?, ?, ?, ?)",
+			(stage, species, state, time.time()),
+		)
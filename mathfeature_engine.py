@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import signal
+import subprocess
+import traceback
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+
+# Código compilado dos scripts do MathFeature (um por processo/worker)
+_compiled_scripts = {}
+
+def load_script(script_path):
+	"""Compila um script do MathFeature uma única vez por processo"""
+	code = _compiled_scripts.get(script_path)
+	if code is None:
+		with open(script_path, "r") as f:
+			code = compile(f.read(), script_path, "exec")
+		_compiled_scripts[script_path] = code
+	return code
+
+def preload_scripts(script_paths):
+	"""Inicializador dos workers: compila os scripts e importa suas dependências (NumPy, Biopython, ...) uma única vez"""
+	for script_path in script_paths:
+		if not os.path.exists(script_path):
+			continue
+
+		# Executa o corpo do módulo sem o bloco __main__: apenas imports e definições
+		script_globals = {"__name__": "mathfeature_preload", "__file__": script_path}
+		with _script_context(script_path, [], ""), redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+			try:
+				exec(load_script(script_path), script_globals)
+			except BaseException:
+				pass  # O erro real aparece na primeira execução do script
+			finally:
+				_release_globals(script_globals)
+
+@contextmanager
+def _script_context(script_path, args, stdin_text):
+	"""Simula argv, stdin e sys.path de `python3 script args < stdin`"""
+	saved_argv, saved_stdin, saved_path = sys.argv, sys.stdin, list(sys.path)
+	sys.argv = [script_path] + list(args)
+	sys.stdin = io.StringIO(stdin_text or "")
+	sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
+	try:
+		yield
+	finally:
+		sys.argv, sys.stdin = saved_argv, saved_stdin
+		sys.path[:] = saved_path
+
+@contextmanager
+def _time_limit(timeout, cmd):
+	"""Aplica o mesmo timeout do subprocess usando SIGALRM (apenas na thread principal)"""
+	if not timeout or not hasattr(signal, "setitimer") or signal.getsignal(signal.SIGALRM) not in (signal.SIG_DFL, None):
+		yield
+		return
+
+	def on_timeout(signum, frame):
+		raise subprocess.TimeoutExpired(cmd, timeout)
+
+	try:
+		signal.signal(signal.SIGALRM, on_timeout)
+	except ValueError:  # Fora da thread principal
+		yield
+		return
+
+	signal.setitimer(signal.ITIMER_REAL, timeout)
+	try:
+		yield
+	finally:
+		signal.setitimer(signal.ITIMER_REAL, 0)
+		signal.signal(signal.SIGALRM, signal.SIG_DFL)
+
+def _release_globals(script_globals):
+	"""Fecha arquivos deixados abertos pelo script e quebra o ciclo funções <-> globals.
+
+	Num subprocesso o fim do interpretador garante o flush; aqui precisamos fazê-lo antes
+	de o chamador verificar o arquivo de saída."""
+	for value in list(script_globals.values()):
+		if isinstance(value, io.IOBase) and value not in (sys.stdin, sys.stdout, sys.stderr):
+			try:
+				value.close()
+			except Exception:
+				pass
+	script_globals.clear()
+
+	# Figuras do matplotlib sobreviveriam entre execuções no mesmo processo
+	pyplot = sys.modules.get("matplotlib.pyplot")
+	if pyplot is not None:
+		pyplot.close("all")
+
+def run_script(script_path, args, stdin_text=None, timeout=None):
+	"""Executa um script do MathFeature no processo atual, equivalente a `python3 script args < stdin`.
+
+	Erros do script viram subprocess.CalledProcessError para manter o tratamento das funções run_*."""
+	cmd = ["python3", script_path] + list(args)
+	script_globals = {"__name__": "__main__", "__file__": script_path, "__builtins__": __builtins__}
+	stdout, stderr = io.StringIO(), io.StringIO()
+
+	try:
+		code = load_script(script_path)  # Script ausente ou inválido: erro do script, como no python3
+		with _script_context(script_path, args, stdin_text), _time_limit(timeout, cmd), redirect_stdout(stdout), redirect_stderr(stderr):
+			exec(code, script_globals)
+	except SystemExit as e:
+		if e.code not in (None, 0):
+			if not isinstance(e.code, int):
+				stderr.write(f"{e.code}\n")
+			returncode = e.code if isinstance(e.code, int) else 1
+			raise subprocess.CalledProcessError(returncode, cmd, stdout.getvalue(), stderr.getvalue())
+	except subprocess.TimeoutExpired:
+		raise
+	except Exception:
+		raise subprocess.CalledProcessError(1, cmd, stdout.getvalue(), stderr.getvalue() + traceback.format_exc())
+	finally:
+		_release_globals(script_globals)
+
+	return subprocess.CompletedProcess(cmd, 0, stdout.getvalue(), stderr.getvalue())
@@ -0,0 +1,231 @@
+import os
+import math
+from collections import OrderedDict
+import numpy as np
+
+# Kernels NumPy que substituem scripts do MathFeature, com a mesma linha de comando e o mesmo CSV de saída.
+# Cada kernel recebe (args, linhas da entrada padrão) e retorna False quando a chamada usa opções ou
+# sequências que ele não reproduz fielmente; nesse caso o script original é executado.
+
+# Código de 2 bits de cada nucleotídeo (A=0, C=1, G=2, T=3); os demais caracteres recebem INVALID
+NUCLEOTIDES = "ACGT"
+INVALID = 255
+_ENCODING = np.full(256, INVALID, dtype=np.uint8)
+for _code, _nucleotide in enumerate(NUCLEOTIDES):
+	_ENCODING[ord(_nucleotide)] = _code
+
+# Limite de células (sequências x 4^k) de cada bincount em lote
+BINCOUNT_CELLS = 1 << 24
+
+# Tabelas de probabilidade dos k-mers (k = 1..K) guardadas por (sequência, K): Shannon e Tsallis da
+# mesma sequência (no mesmo worker) contam os k-mers uma única vez
+KMER_TABLE_CACHE_ENTRIES = 20000
+_kmer_tables = OrderedDict()
+
+def read_fasta(fasta_path):
+	"""Lê um (multi-)FASTA como [(nome, sequência)], com o nome e a sequência que o Biopython (SeqIO) produziria"""
+	records = []
+	name, lines = None, []
+	with open(fasta_path, "r") as f:
+		for line in f:
+			if line.startswith(">"):
+				if name is not None:
+					records.append((name, "".join(lines)))
+				name, lines = (line[1:].split(maxsplit=1) or [""])[0], []
+			elif name is not None:
+				lines.append(line.strip().replace(" ", ""))
+	if name is not None:
+		records.append((name, "".join(lines)))
+	return records
+
+def encode(seq):
+	"""Codifica uma sequência (já em maiúsculas) em 2 bits por nucleotídeo"""
+	return _ENCODING[np.frombuffer(seq.encode("latin-1"), dtype=np.uint8)]
+
+def _option(args, flag, default=None):
+	"""Valor de uma opção da linha de comando dos scripts (ex.: -i arquivo)"""
+	return args[args.index(flag) + 1] if flag in args and args.index(flag) + 1 < len(args) else default
+
+def _format(values):
+	"""Formata uma lista de floats como o MathFeature (str(float(valor))), usando o repr de lista em C"""
+	return repr([float(value) for value in values])[1:-1].replace(", ", ",")
+
+def kmer_indices(codes, k):
+	"""Índice de cada k-mer (janela deslizante) em base 4, calculado de forma incremental a partir de k = 1"""
+	indices = codes.astype(np.int64)
+	for j in range(1, k):
+		indices = indices[:-1] * 4 + codes[j:]
+	return indices
+
+def kmer_counts(encoded, k):
+	"""Contagem dos 4^k k-mers de várias sequências, em lotes de bincount; retorna uma matriz (sequências x 4^k)"""
+	size = 4 ** k
+	counts = np.zeros((len(encoded), size), dtype=np.int64)
+	step = max(1, BINCOUNT_CELLS // size)
+	for begin in range(0, len(encoded), step):
+		block = encoded[begin:begin + step]
+		indices = [kmer_indices(codes, k) + i * size for i, codes in enumerate(block)]
+		flat = np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+		counts[begin:begin + len(block)] = np.bincount(flat, minlength=len(block) * size).reshape(len(block), size)
+	return counts
+
+def kmer_probabilities(records, ksize):
+	"""Probabilidades dos k-mers presentes (k = 1..ksize) de cada sequência: [[floats de k=1, ..., floats de k=K]].
+
+	As contagens saem de um bincount em lote; a ordem de cada tabela é a de primeira ocorrência do k-mer na
+	sequência (a ordem do dicionário dos scripts), para que as somas sejam feitas na mesma ordem."""
+	missing = [(seq, codes) for seq, codes in records if (seq, ksize) not in _kmer_tables]
+	if missing:
+		encoded = [codes for _, codes in missing]
+		tables = [[] for _ in missing]
+		for k in range(1, ksize + 1):
+			counts = kmer_counts(encoded, k)
+			for i, codes in enumerate(encoded):
+				present, first = np.unique(kmer_indices(codes, k), return_index=True)
+				present = present[np.argsort(first)]
+				tables[i].append((counts[i, present] / (len(codes) - k + 1)).tolist())
+		for (seq, _), table in zip(missing, tables):
+			_kmer_tables[(seq, ksize)] = table
+			_kmer_tables.move_to_end((seq, ksize))
+		while len(_kmer_tables) > max(KMER_TABLE_CACHE_ENTRIES, len(records)):
+			_kmer_tables.popitem(last=False)
+	return [_kmer_tables[(seq, ksize)] for seq, _ in records]
+
+def shannon_entropy(probabilities):
+	"""Entropia de Shannon de cada tabela k = 1..K: -sum(p * log2(p))"""
+	return [-(sum([p * math.log(p, 2) for p in table])) for table in probabilities]
+
+def tsallis_entropy(probabilities, q):
+	"""Entropia de Tsallis de cada tabela k = 1..K: (1 - sum(p^q)) / (q - 1); q pode ser uma lista de valores"""
+	if isinstance(q, (list, tuple)):
+		return [tsallis_entropy(probabilities, value) for value in q]
+	return [(1 / (q - 1)) * (1 - sum([p ** q for p in table])) for table in probabilities]
+
+def _entropy_rows(args, entropy):
+	"""Lê as sequências de -i e grava nameseq,k1..kK,label com entropy(tabelas) para cada uma"""
+	ksize = _option(args, "-k")
+	if not ksize or not ksize.isdigit() or int(ksize) < 1:
+		return False
+	ksize = int(ksize)
+	records = _sequences(_option(args, "-i"))
+	if records is None or any(len(codes) < ksize for _, _, codes in records):
+		return False
+
+	tables = kmer_probabilities([(seq, codes) for _, seq, codes in records], ksize)
+	with open(_option(args, "-o"), "a") as f:
+		f.write(",".join(["nameseq"] + [f"k{k}" for k in range(1, ksize + 1)] + ["label"]) + "\n")
+		for (name, _, _), table in zip(records, tables):
+			f.write(f"{name},{_format(entropy(table))},{_option(args, '-l')}\n")
+	return True
+
+def entropy_class(args, stdin_lines):
+	"""EntropyClass.py -e Shannon -k K: entropia de Shannon dos k-mers, k = 1..K"""
+	if (_option(args, "-e") or "").lower() != "shannon":
+		return False
+	return _entropy_rows(args, shannon_entropy)
+
+def tsallis_entropy_class(args, stdin_lines):
+	"""TsallisEntropy.py -q Q -k K: entropia de Tsallis dos k-mers, k = 1..K"""
+	try:
+		q = float(_option(args, "-q"))
+	except (TypeError, ValueError):
+		return False
+	if q == 1:
+		return False
+	return _entropy_rows(args, lambda table: tsallis_entropy(table, q))
+
+def _kmer_names(k):
+	"""k-mers na ordem de itertools.product("ACGT", repeat=k), que coincide com a ordem dos índices em base 4"""
+	names = [""]
+	for _ in range(k):
+		names = [name + nucleotide for name in names for nucleotide in NUCLEOTIDES]
+	return names
+
+def _encoded_records(fasta_path, min_length=1):
+	"""Sequências do arquivo codificadas; None se alguma tiver caracteres fora de ACGT ou for curta demais"""
+	records = []
+	for name, seq in read_fasta(fasta_path):
+		codes = encode(seq.upper())
+		if len(codes) < min_length or (codes == INVALID).any():
+			return None
+		records.append((name, codes))
+	return records
+
+def _sequences(fasta_path):
+	"""[(nome, sequência, códigos)] com as mesmas restrições de _encoded_records"""
+	records = []
+	for name, seq in read_fasta(fasta_path):
+		seq = seq.upper()
+		codes = encode(seq)
+		if not len(codes) or (codes == INVALID).any():
+			return None
+		records.append((name, seq, codes))
+	return records
+
+def extraction_techniques(args, stdin_lines):
+	"""ExtractionTechniques.py -t kmer -seq 1: frequência de todos os k-mers, k = 1..K (K lido da entrada padrão)"""
+	if _option(args, "-t") != "kmer" or _option(args, "-seq") != "1" or not stdin_lines or not stdin_lines[0].strip().isdigit():
+		return False
+	ksize = int(stdin_lines[0])
+	records = _encoded_records(_option(args, "-i"), min_length=ksize)
+	if records is None or ksize < 1:
+		return False
+
+	header = ["nameseq"] + [name for k in range(1, ksize + 1) for name in _kmer_names(k)] + ["label"]
+	label = _option(args, "-l")
+	step = max(1, BINCOUNT_CELLS // 4 ** ksize)  # Sequências por bloco: limita a matriz de frequências em memória
+
+	with open(_option(args, "-o"), "a") as f:
+		f.write(",".join(header) + "\n")
+		for begin in range(0, len(records), step):
+			block = records[begin:begin + step]
+			encoded = [codes for _, codes in block]
+			lengths = np.array([len(codes) for codes in encoded], dtype=np.int64)
+			# Frequência = ocorrências / (L - k + 1) janelas
+			frequencies = np.hstack([kmer_counts(encoded, k) / (lengths - k + 1)[:, None] for k in range(1, ksize + 1)])
+			for (name, _), row in zip(block, frequencies):
+				f.write(f"{name},{_format(row.tolist())},{label}\n")
+	return True
+
+def accumulated_frequencies(encoded):
+	"""ANF: em cada posição i, a frequência do nucleotídeo s[i] em s[:i+1]. encoded é uma matriz (sequências x
+	posições), todas do mesmo tamanho; as contagens acumuladas saem de um cumsum por nucleotídeo."""
+	counts = np.zeros(encoded.shape, dtype=np.int64)
+	for code in range(len(NUCLEOTIDES)):
+		hits = encoded == code
+		counts[hits] = np.cumsum(hits, axis=1)[hits]
+	return counts / np.arange(1, encoded.shape[1] + 1)
+
+def accumulated_nucleotide_frequency(args, stdin_lines):
+	"""AccumulatedNucleotideFrequency.py -n 1 -r 1: ANF classic (sem cabeçalho).
+
+	O -r 2 (descritores de Fourier do ANF) continua com o script: a FFT daqui difere nos últimos dígitos."""
+	if _option(args, "-n") != "1" or len(stdin_lines) < 2 or _option(args, "-r") != "1":
+		return False
+	records = _encoded_records(stdin_lines[0].strip())
+	if records is None:
+		return False
+	label = stdin_lines[1].strip()
+
+	if len({len(codes) for _, codes in records}) > 1:
+		return False  # O script completa com zeros até a maior sequência; deixamos isso com ele
+	frequencies = accumulated_frequencies(np.vstack([codes for _, codes in records])) if records else []
+	with open(_option(args, "-o"), "a") as f:
+		for (name, _), row in zip(records, frequencies):
+			f.write(f"{name},{_format(row.tolist())},{label}\n")
+	return True
+
+# Kernel de cada script do MathFeature (pelo nome do arquivo)
+NATIVE_SCRIPTS = {
+	"ExtractionTechniques.py": extraction_techniques,
+	"EntropyClass.py": entropy_class,
+	"TsallisEntropy.py": tsallis_entropy_class,
+	"AccumulatedNucleotideFrequency.py": accumulated_nucleotide_frequency,
+}
+
+def run_native(script, args, stdin_text=None):
+	"""Executa o kernel equivalente ao script. Retorna False quando não há kernel para essa chamada"""
+	kernel = NATIVE_SCRIPTS.get(os.path.basename(script))
+	if kernel is None:
+		return False
+	return kernel(list(args), (stdin_text or "").splitlines())
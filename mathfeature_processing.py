@@ -1,9 +1,21 @@
 import os
+import argparse
 import subprocess
 import logging
-from multiprocessing import Pool, cpu_count
+import traceback
 import gc
+import time
+import tempfile
 from datetime import datetime
+import mathfeature_engine
+import mathfeature_kernels
+import sequence_dedup
+import feature_store
+import scheduler
+import manifest
+import metrics
+import tracing
+import profiling
 
 # Configurações
 DATA_DIR = "data"
@@ -26,6 +38,32 @@ SCRIPTS = {
 
 }
 
+# Motor de execução dos scripts do MathFeature:
+#   "inprocess"  - importa os métodos uma vez por worker e executa no próprio processo
+#   "subprocess" - um interpretador python3 por operação (comportamento antigo)
+ENGINE = "inprocess"
+
+# Scripts substituídos pelos kernels NumPy de mathfeature_kernels (os demais continuam com o motor acima).
+# Um kernel só entra aqui depois de a saída ser conferida com os CSVs gravados pelo script (kernel_check.py).
+# No AccumulatedNucleotideFrequency.py só o -r 1 (classic) usa o kernel; o -r 2 (fourier) segue com o script.
+# Os kernels de k-mers e de entropia (ExtractionTechniques.py, EntropyClass.py, TsallisEntropy.py) ficam de
+# fora: ainda não há CSVs dessas operações gravados para conferi-los.
+NATIVE_KERNELS = {"AccumulatedNucleotideFrequency.py"}
+
+# Quantidade de TEs concatenados em um único multi-FASTA por chamada do MathFeature
+# (1 = uma chamada por TE, como antes)
+BATCH_SIZE = 500
+
+# Grava as features também no store colunar (data/<planta>/features/..., lido com feature_store.read_features)
+FEATURE_STORE = True
+
+# Mantém os CSVs por TE depois de gravados no store: o treinamento ainda lê os CSVs. False remove cada
+# CSV assim que ele entra no store (só quando todos os consumidores lerem do store)
+KEEP_CSV_FILES = True
+
+# Quantidade máxima de CSVs gravados em cada part do store
+STORE_CHUNK_SIZE = 1000
+
 # Representações numéricas
 NUMERICAL_REPRESENTATIONS = {
 	# 1: "binary",
@@ -57,6 +95,52 @@ ANF_TYPES = {
 	2: "fourier",
 }
 
+# Pasta e variantes de saída de cada operação
+OUTPUT_LAYOUT = {
+	"mapping": ("mappings", NUMERICAL_REPRESENTATIONS),
+	"chaos": ("chaos", CHAOS_APPROACHES),
+	"fourier": ("fourier", NUMERICAL_REPRESENTATIONS),
+	"entropy": ("entropy", ENTROPY_TYPES),
+	"complex_networks": ("complex_networks", None),
+	"k-mer": ("k-mer", None),
+	"anf": ("anf", ANF_TYPES),
+	"orf": ("orf", None),
+	"fickett_score": ("fickett_score", None),
+}
+
+# Operações executadas para cada sequência, na ordem, após o pré-processamento
+OPERATIONS = [
+	("mapping", num) for num in NUMERICAL_REPRESENTATIONS
+] + [
+	("chaos", num) for num in CHAOS_APPROACHES
+] + [
+	("fourier", num) for num in NUMERICAL_REPRESENTATIONS
+] + [
+	("entropy", num) for num in ENTROPY_TYPES
+] + [
+	("complex_networks", None),
+	("k-mer", None)
+] + [
+	("anf", num) for num in ANF_TYPES
+] + [
+	("orf", None),
+	("fickett_score", None)
+]
+
+# Operações que geram um valor por nucleotídeo: o MathFeature completa as linhas com zeros
+# até a maior sequência da entrada, então em lote só agrupamos sequências de mesmo tamanho
+POSITIONAL_OPERATIONS = {
+	"mapping": set(NUMERICAL_REPRESENTATIONS),
+	"chaos": {1},
+	"anf": {1},
+}
+
+# Métricas exportadas (metrics.METRICS_FILE, formato Prometheus)
+SEQUENCES_METRIC = "mathfeature_sequences_total"  # TEs por situação: found, processed, skipped, already_processed, duplicate, failed
+OPERATIONS_METRIC = "mathfeature_operations_total"  # TEs concluídos por operação
+FAILURES_METRIC = "mathfeature_operation_failures_total"  # Chamadas com falha por operação
+LATENCY_METRIC = "mathfeature_operation_seconds"  # Duração das chamadas (uma por TE ou por lote)
+
 # Configuração do sistema de logs
 logging.basicConfig(
 	level=logging.INFO,
@@ -83,47 +167,160 @@ def check_file_valid(domain_path, seq_path):
 	
 	return True
 
-def is_already_processed(plant, seq_name, operation=None, representation_num=None):
-	"""Verifica se o processamento já foi realizado"""
+def operation_output_file(plant, seq_name, operation=None, representation_num=None):
+	"""Retorna o arquivo gerado por uma operação (None = pré-processamento)"""
 	base_name = seq_name.replace('.fasta', '')
-	
-	# Verifica pré-processamento
+
 	if operation is None:
-		preprocessed_file = os.path.join(DATA_DIR, plant, "preprocessing", f"{base_name}.fasta")
-		return os.path.exists(preprocessed_file)
-	
-	# Determina o diretório de saída baseado na operação
-	if operation == "mapping":
-		output_dir = os.path.join(DATA_DIR, plant, "mappings", NUMERICAL_REPRESENTATIONS[representation_num])
-		output_file = os.path.join(output_dir, f"{base_name}_{NUMERICAL_REPRESENTATIONS[representation_num]}.csv")
-	elif operation == "chaos":
-		output_dir = os.path.join(DATA_DIR, plant, "chaos", CHAOS_APPROACHES[representation_num])
-		output_file = os.path.join(output_dir, f"{base_name}_{CHAOS_APPROACHES[representation_num]}.csv")
-	elif operation == "fourier":
-		output_dir = os.path.join(DATA_DIR, plant, "fourier", NUMERICAL_REPRESENTATIONS[representation_num])
-		output_file = os.path.join(output_dir, f"{base_name}_{NUMERICAL_REPRESENTATIONS[representation_num]}.csv")
-	elif operation == "entropy":
-		output_dir = os.path.join(DATA_DIR, plant, "entropy", ENTROPY_TYPES[representation_num])
-		output_file = os.path.join(output_dir, f"{base_name}_{ENTROPY_TYPES[representation_num]}.csv")
-	elif operation == "complex_networks":
-		output_dir = os.path.join(DATA_DIR, plant, "complex_networks")
-		output_file = os.path.join(output_dir, f"{base_name}_complex_networks.csv")
-	elif operation == "k-mer":
-		output_dir = os.path.join(DATA_DIR, plant, "k-mer")
-		output_file = os.path.join(output_dir, f"{base_name}_k-mer.csv")
-	elif operation == "anf":
-		output_dir = os.path.join(DATA_DIR, plant, "anf", ANF_TYPES[representation_num])
-		output_file = os.path.join(output_dir, f"{base_name}_{ANF_TYPES[representation_num]}.csv")
-	elif operation == "orf":
-		output_dir = os.path.join(DATA_DIR, plant, "orf")
-		output_file = os.path.join(output_dir, f"{base_name}_orf.csv")
-	elif operation == "fickett_score":
-		output_dir = os.path.join(DATA_DIR, plant, "fickett_score")
-		output_file = os.path.join(output_dir, f"{base_name}_fickett_score.csv")
-	else:
+		return os.path.join(DATA_DIR, plant, "preprocessing", f"{base_name}.fasta")
+
+	folder, variants = OUTPUT_LAYOUT[operation]
+	if variants is None:
+		return os.path.join(DATA_DIR, plant, folder, f"{base_name}_{operation}.csv")
+
+	variant = variants[representation_num]
+	return os.path.join(DATA_DIR, plant, folder, variant, f"{base_name}_{variant}.csv")
+
+def operation_feature(operation, representation_num=None):
+	"""Nome da feature no store: a pasta da operação relativa à planta (ex.: "anf/classic")"""
+	folder, variants = OUTPUT_LAYOUT[operation]
+	if variants is None:
+		return folder
+	return f"{folder}/{variants[representation_num]}"
+
+def operation_step(operation=None, representation_num=None):
+	"""Nome da etapa no manifesto: "preprocessing" ou o nome da feature (ex.: "anf/classic")"""
+	return "preprocessing" if operation is None else operation_feature(operation, representation_num)
+
+def output_location(plant, seq_name, operation=None, representation_num=None):
+	"""Onde a saída fica guardada: o dataset do store ou o arquivo gerado"""
+	if operation is not None and FEATURE_STORE:
+		return feature_store.feature_dir(DATA_DIR, plant, operation_feature(operation, representation_num))
+	return operation_output_file(plant, seq_name, operation, representation_num)
+
+def is_already_processed(plant, seq_name, operation=None, representation_num=None):
+	"""Verifica se o processamento já foi realizado (uma consulta ao manifesto)"""
+	if operation is not None and operation not in OUTPUT_LAYOUT:
 		return False
-	
-	return os.path.exists(output_file)
+	return bool(manifest.is_done(plant, seq_name.replace('.fasta', ''), operation_step(operation, representation_num)))
+
+def backfill_manifest(plant, seq_names):
+	"""Registra no manifesto as saídas geradas antes dele existir (CSVs na pasta ou TEs já no store).
+
+	Executado uma vez por espécie antes de montar a fila: a partir daí as verificações são só consultas ao manifesto."""
+	recorded = manifest.recorded_steps(plant)
+	rows = []
+	for operation, num in [(None, None)] + OPERATIONS:
+		if operation is not None and operation not in OUTPUT_LAYOUT:
+			continue
+		step = operation_step(operation, num)
+		missing = [seq_name for seq_name in seq_names if (seq_name.replace('.fasta', ''), step) not in recorded]
+		if not missing:
+			continue
+
+		output_file = operation_output_file(plant, "", operation, num)
+		output_dir, suffix = os.path.dirname(output_file), os.path.basename(output_file)
+		found = {f[:-len(suffix)] for f in os.listdir(output_dir) if f.endswith(suffix)} if os.path.isdir(output_dir) else set()
+		if operation is not None and FEATURE_STORE:
+			found |= feature_store.stored_names(DATA_DIR, plant, operation_feature(operation, num))
+
+		rows.extend(
+			(seq_name.replace('.fasta', ''), step, manifest.SUCCESS, output_location(plant, seq_name, operation, num), None, time.time())
+			for seq_name in missing if seq_name.replace('.fasta', '') in found
+		)
+	manifest.record_many(plant, rows)
+
+def record_outputs(plant, seq_names, operation=None, representation_num=None, started=None, succeeded=True):
+	"""Registra no manifesto o resultado de uma operação: SUCCESS para quem ganhou o arquivo de saída.
+
+	O pré-processamento conta como feito mesmo com saída vazia (sequência descartada pelo MathFeature)."""
+	finished = time.time()
+	step = operation_step(operation, representation_num)
+	rows = []
+	for seq_name in seq_names:
+		created = succeeded and os.path.exists(operation_output_file(plant, seq_name, operation, representation_num))
+		output = output_location(plant, seq_name, operation, representation_num) if created else None
+		rows.append((seq_name.replace('.fasta', ''), step, manifest.SUCCESS if created else manifest.WAITING, output, started, finished))
+	manifest.record_many(plant, rows)
+
+def operation_command(operation, num, seq_path, output_file):
+	"""Monta o script, os argumentos e a entrada padrão do MathFeature para uma operação"""
+	if operation is None:
+		return PREPROCESSING_SCRIPT, ["-i", seq_path, "-o", output_file], None
+
+	if operation == "mapping":
+		args = ["-n", "1", "-o", output_file, "-r", str(num)]
+		return SCRIPTS["mapping"], args, f"{seq_path}\n{NUMERICAL_REPRESENTATIONS[num]}\n"
+
+	if operation == "chaos":
+		args = ["-n", "1", "-o", output_file, "-r", str(num)]
+		stdin_text = f"{seq_path}\n{CHAOS_APPROACHES[num]}\n"
+		if num % 2 == 0:
+			stdin_text += "4\n"
+		return SCRIPTS["chaos"], args, stdin_text
+
+	if operation == "fourier":
+		args = ["-i", seq_path, "-o", output_file, "-l", NUMERICAL_REPRESENTATIONS[num], "-r", str(num)]
+		return SCRIPTS["fourier"], args, None
+
+	if operation == "entropy":
+		if num == 1:  # Shannon
+			args = ["-i", seq_path, "-o", output_file, "-l", "shannon", "-k", "4", "-e", "Shannon"]
+			return SCRIPTS["entropy"], args, None
+		# Tsallis (q = 2.5)
+		args = ["-i", seq_path, "-o", output_file, "-l", "tsallis", "-k", "4", "-q", "2.5"]
+		return SCRIPTS["tsallis"], args, None
+
+	if operation == "complex_networks":
+		args = ["-i", seq_path, "-o", output_file, "-l", "complex_networks", "-k", "4"]
+		return SCRIPTS["complex_networks"], args, None
+
+	if operation == "k-mer":
+		args = ["-i", seq_path, "-o", output_file, "-l", "6-mer", "-t", "kmer", "-seq", "1"]  # DNA
+		return SCRIPTS["k-mer"], args, "6\n"
+
+	if operation == "anf":
+		args = ["-n", "1", "-o", output_file, "-r", str(num)]
+		return SCRIPTS["anf"], args, f"{seq_path}\n{ANF_TYPES[num]}\n"
+
+	if operation == "orf":
+		return SCRIPTS["orf"], ["-i", seq_path, "-o", output_file, "-l", "orf"], None
+
+	if operation == "fickett_score":
+		args = ["-i", seq_path, "-o", output_file, "-l", "fickett_score", "-seq", "1"]  # DNA
+		return SCRIPTS["fickett_score"], args, None
+
+	raise ValueError(f"Operação desconhecida: {operation}")
+
+def run_mathfeature(script, args, stdin_text=None, timeout=600):
+	"""Executa um script do MathFeature com o motor configurado em ENGINE (ou com o kernel NumPy equivalente)"""
+	if os.path.basename(script) in NATIVE_KERNELS:
+		cmd = ["python3", script] + list(args)
+		try:
+			if mathfeature_kernels.run_native(script, args, stdin_text):
+				return subprocess.CompletedProcess(cmd, 0, "", "")
+		except Exception:
+			raise subprocess.CalledProcessError(1, cmd, "", traceback.format_exc())
+
+	if ENGINE == "subprocess":
+		return subprocess.run(
+			["python3", script] + args,
+			input=stdin_text or "",
+			check=True,
+			timeout=timeout,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE,
+			text=True
+		)
+
+	return mathfeature_engine.run_script(script, args, stdin_text, timeout)
+
+def init_worker(metrics_queue=None):
+	"""Carrega os scripts do MathFeature uma única vez por worker e liga as métricas ao processo principal"""
+	if metrics_queue is not None:
+		metrics.init_worker(metrics_queue)
+	if ENGINE == "inprocess":
+		mathfeature_engine.preload_scripts([PREPROCESSING_SCRIPT] + list(SCRIPTS.values()))
 
 def run_preprocessing(plant, seq_name):
 	"""Executa o pré-processamento se necessário"""
@@ -136,18 +333,10 @@ def run_preprocessing(plant, seq_name):
 	os.makedirs(output_dir, exist_ok=True)
 	
 	output_file = os.path.join(output_dir, seq_name)
-	cmd = f"python3 {PREPROCESSING_SCRIPT} -i {seq_path} -o {output_file}"
 	
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		script, args, stdin_text = operation_command(None, None, seq_path, output_file)
+		run_mathfeature(script, args, stdin_text)
 
 		if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
 			logging.error(f"FALHA PRÉ-PROCESSAMENTO: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado ou vazio")
@@ -155,7 +344,7 @@ def run_preprocessing(plant, seq_name):
 			
 		logging.info(f"SUCESSO PRÉ-PROCESSAMENTO: {plant}/{seq_name}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA PRÉ-PROCESSAMENTO: {plant}/{seq_name} | Erro: {str(e)}")
 		return False
 	finally:
@@ -175,31 +364,11 @@ def run_numerical_mapping(plant, seq_name, representation_num):
 	output_dir = os.path.join(DATA_DIR, plant, "mappings", NUMERICAL_REPRESENTATIONS[representation_num])
 	os.makedirs(output_dir, exist_ok=True)
 
-	in_name = f"map_{seq_name}.in"
-	with open(in_name, "w") as f:
-		f.write(f"{seq_path}\n")
-		f.write(f"{NUMERICAL_REPRESENTATIONS[representation_num]}\n")
-	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_{NUMERICAL_REPRESENTATIONS[representation_num]}.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["mapping"],
-		"-n", "1",
-		"-o", output_file,
-		"-r", str(representation_num),
-		"<", in_name
-	])
+	script, args, stdin_text = operation_command("mapping", representation_num, seq_path, output_file)
 
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA MAPEAMENTO: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -214,7 +383,6 @@ def run_numerical_mapping(plant, seq_name, representation_num):
 		return False
 	finally:
 		gc.collect()  # Liberar memória
-		os.remove(in_name)  # Remove o arquivo de entrada
 
 
 def run_chaos_mapping(plant, seq_name, approach_num):
@@ -231,33 +399,11 @@ def run_chaos_mapping(plant, seq_name, approach_num):
 	output_dir = os.path.join(DATA_DIR, plant, "chaos", CHAOS_APPROACHES[approach_num])
 	os.makedirs(output_dir, exist_ok=True)
 	
-	in_name = f"chaos_{seq_name}.in"
-	with open(in_name, "w") as f:
-		f.write(f"{seq_path}\n")
-		f.write(f"{CHAOS_APPROACHES[approach_num]}\n")
-		if approach_num % 2 == 0:
-			f.write("4\n")
-	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_{CHAOS_APPROACHES[approach_num]}.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["chaos"],
-		"-n", "1",
-		"-o", output_file,
-		"-r", str(approach_num),
-		"<", in_name
-	])
+	script, args, stdin_text = operation_command("chaos", approach_num, seq_path, output_file)
 	
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA CHAOS: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -265,12 +411,11 @@ def run_chaos_mapping(plant, seq_name, approach_num):
 			
 		logging.info(f"SUCESSO CHAOS: {plant}/{seq_name} -> {CHAOS_APPROACHES[approach_num]}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA CHAOS: {plant}/{seq_name} -> {CHAOS_APPROACHES[approach_num]} | Erro: {str(e)}")
 		return False
 	finally:
 		gc.collect()  # Liberar memória
-		os.remove(in_name)  # Remove o arquivo de entrada
 
 def run_fourier_analysis(plant, seq_name, representation_num):
 	"""Executa análise de Fourier"""
@@ -287,25 +432,10 @@ def run_fourier_analysis(plant, seq_name, representation_num):
 	os.makedirs(output_dir, exist_ok=True)
 	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_{NUMERICAL_REPRESENTATIONS[representation_num]}.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["fourier"],
-		"-i", seq_path,
-		"-o", output_file,
-		"-l", NUMERICAL_REPRESENTATIONS[representation_num],
-		"-r", str(representation_num)
-	])
+	script, args, stdin_text = operation_command("fourier", representation_num, seq_path, output_file)
 	
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA FOURIER: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -313,7 +443,7 @@ def run_fourier_analysis(plant, seq_name, representation_num):
 			
 		logging.info(f"SUCESSO FOURIER: {plant}/{seq_name}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA FOURIER: {plant}/{seq_name} | Erro: {str(e)}")
 		return False
 	finally:
@@ -335,37 +465,10 @@ def run_entropy_analysis(plant, seq_name, entropy_type):
 	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_{ENTROPY_TYPES[entropy_type]}.csv")
 	
-	if entropy_type == 1:  # Shannon
-		cmd = ' '.join([
-			"python3",
-			SCRIPTS["entropy"],
-			"-i", seq_path,
-			"-o", output_file,
-			"-l", "shannon",
-			"-k", "4",  # 1-mer e 2-mer
-			"-e", "Shannon"
-		])
-	else:  # Tsallis
-		cmd = ' '.join([
-			"python3",
-			SCRIPTS["tsallis"],
-			"-i", seq_path,
-			"-o", output_file,
-			"-l", "tsallis",
-			"-k", "4",
-			"-q", "2.5"  # Parâmetro q padrão
-		])
+	script, args, stdin_text = operation_command("entropy", entropy_type, seq_path, output_file)
 	
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA ENTROPIA: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -373,7 +476,7 @@ def run_entropy_analysis(plant, seq_name, entropy_type):
 			
 		logging.info(f"SUCESSO ENTROPIA: {plant}/{seq_name} -> {ENTROPY_TYPES[entropy_type]}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA ENTROPIA: {plant}/{seq_name} -> {ENTROPY_TYPES[entropy_type]} | Erro: {str(e)}")
 		return False
 	finally:
@@ -394,25 +497,10 @@ def run_complex_networks(plant, seq_name):
 	os.makedirs(output_dir, exist_ok=True)
 	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_complex_networks.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["complex_networks"],
-		"-i", seq_path,
-		"-o", output_file,
-		"-l", "complex_networks",
-		"-k", "4"  # k-mer 2 e 3
-	])
+	script, args, stdin_text = operation_command("complex_networks", None, seq_path, output_file)
 	
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA REDES COMPLEXAS: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -420,7 +508,7 @@ def run_complex_networks(plant, seq_name):
 			
 		logging.info(f"SUCESSO REDES COMPLEXAS: {plant}/{seq_name}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA REDES COMPLEXAS: {plant}/{seq_name} | Erro: {str(e)}")
 		return False
 	finally:
@@ -440,32 +528,11 @@ def run_k_mer(plant, seq_name):
 	output_dir = os.path.join(DATA_DIR, plant, "k-mer")
 	os.makedirs(output_dir, exist_ok=True)
 
-	in_name = f"kmer_{seq_name}.in"
-	with open(in_name, "w") as f:
-		f.write("6\n")
-	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_k-mer.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["k-mer"],
-		"-i", seq_path,
-		"-o", output_file,
-		"-l", "6-mer",
-		"-t", "kmer",
-		"-seq", "1", # DNA
-		"<", in_name
-	])
+	script, args, stdin_text = operation_command("k-mer", None, seq_path, output_file)
 
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA K-MER: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -473,12 +540,11 @@ def run_k_mer(plant, seq_name):
 			
 		logging.info(f"SUCESSO K-MER: {plant}/{seq_name}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA K-MER: {plant}/{seq_name} | Erro: {str(e)}")
 		return False
 	finally:
 		gc.collect()  # Liberar memória
-		os.remove(in_name)  # Remove o arquivo de entrada
 
 def run_accumulated_nucleotide_frequency(plant, seq_name, representation_num):
 	"""Executa analise de ANF"""
@@ -494,31 +560,11 @@ def run_accumulated_nucleotide_frequency(plant, seq_name, representation_num):
 	output_dir = os.path.join(DATA_DIR, plant, "anf", ANF_TYPES[representation_num])
 	os.makedirs(output_dir, exist_ok=True)
 
-	in_name = f"anf_{seq_name}.in"
-	with open(in_name, "w") as f:
-		f.write(f"{seq_path}\n")
-		f.write(f"{ANF_TYPES[representation_num]}\n")
-	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_{ANF_TYPES[representation_num]}.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["anf"],
-		"-n", "1",
-		"-o", output_file,
-		"-r", str(representation_num),
-		"<", in_name
-	])
+	script, args, stdin_text = operation_command("anf", representation_num, seq_path, output_file)
 
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA ANF: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -533,7 +579,6 @@ def run_accumulated_nucleotide_frequency(plant, seq_name, representation_num):
 		return False
 	finally:
 		gc.collect()  # Liberar memória
-		os.remove(in_name)  # Remove o arquivo de entrada
 
 def run_orf(plant, seq_name):
 	"""Executa análise de ORF Description"""
@@ -550,24 +595,10 @@ def run_orf(plant, seq_name):
 	os.makedirs(output_dir, exist_ok=True)
 	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_orf.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["orf"],
-		"-i", seq_path,
-		"-o", output_file,
-		"-l", "orf",
-	])
+	script, args, stdin_text = operation_command("orf", None, seq_path, output_file)
 	
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA ORF: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -575,7 +606,7 @@ def run_orf(plant, seq_name):
 			
 		logging.info(f"SUCESSO ORF: {plant}/{seq_name}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA ORF: {plant}/{seq_name} | Erro: {str(e)}")
 		return False
 	finally:
@@ -596,25 +627,10 @@ def run_fickett_score(plant, seq_name):
 	os.makedirs(output_dir, exist_ok=True)
 	
 	output_file = os.path.join(output_dir, f"{seq_name.replace('.fasta', '')}_fickett_score.csv")
-	cmd = ' '.join([
-		"python3",
-		SCRIPTS["fickett_score"],
-		"-i", seq_path,
-		"-o", output_file,
-		"-l", "fickett_score",
-		"-seq", "1", # DNA
-	])
+	script, args, stdin_text = operation_command("fickett_score", None, seq_path, output_file)
 	
 	try:
-		subprocess.run(
-			cmd,
-			shell=True,
-			check=True,
-			timeout=600,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True
-		)
+		run_mathfeature(script, args, stdin_text)
 		
 		if not os.path.exists(output_file):
 			logging.error(f"FALHA FICKETT SCORE: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado")
@@ -622,130 +638,313 @@ def run_fickett_score(plant, seq_name):
 			
 		logging.info(f"SUCESSO FICKETT SCORE: {plant}/{seq_name}")
 		return True
-	except subprocess.CalledProcessError as e:
+	except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
 		logging.error(f"FALHA FICKETT SCORE: {plant}/{seq_name} | Erro: {str(e)}")
 		return False
 	finally:
 		gc.collect()  # Liberar memória
 
-def process_sequence(domain_file, plant, domains_dir, sequences_dir, stats):
+def run_operation(plant, seq_name, operation=None, num=None):
+	"""Executa uma operação para uma única sequência (None = pré-processamento) e registra o resultado no manifesto"""
+	if is_already_processed(plant, seq_name, operation, num):
+		return True
+
+	started = time.time()
+	succeeded = False
+	try:
+		with tracing.span(operation_step(operation, num), "operation", species=plant, te=seq_name.replace('.fasta', ''), mode="single"):
+			succeeded = _run_operation(plant, seq_name, operation, num)
+		return succeeded
+	finally:
+		record_outputs(plant, [seq_name], operation, num, started, succeeded or operation is None)
+		operation_metrics(plant, operation, num, "single", started, int(succeeded), int(not succeeded))
+
+def operation_metrics(plant, operation, num, mode, started, completed, failed):
+	"""Contagens e duração de uma chamada (mode = "single" ou "batch"), enviadas ao processo principal"""
+	feature = operation_step(operation, num)
+	metrics.observe(LATENCY_METRIC, time.time() - started, feature=feature, mode=mode)
+	metrics.inc(OPERATIONS_METRIC, completed, plant=plant, feature=feature, mode=mode)
+	if failed:
+		metrics.inc(FAILURES_METRIC, failed, plant=plant, feature=feature, mode=mode)
+	metrics.flush()
+
+def _run_operation(plant, seq_name, operation=None, num=None):
+	if operation is None:
+		return run_preprocessing(plant, seq_name)
+
+	runner = {
+		"mapping": run_numerical_mapping,
+		"chaos": run_chaos_mapping,
+		"fourier": run_fourier_analysis,
+		"entropy": run_entropy_analysis,
+		"complex_networks": run_complex_networks,
+		"k-mer": run_k_mer,
+		"anf": run_accumulated_nucleotide_frequency,
+		"orf": run_orf,
+		"fickett_score": run_fickett_score,
+	}[operation]
+
+	if num is None:
+		return runner(plant, seq_name)
+	return runner(plant, seq_name, num)
+
+def pending_sequence(domain_file, plant, domains_dir, sequences_dir):
+	"""Retorna o nome da sequência se ela for válida e ainda tiver operações pendentes"""
 	if not domain_file.endswith('.tsv'):
-		return
+		return None
 
-	stats['total_sequences'] += 1
+	metrics.inc(SEQUENCES_METRIC, plant=plant, status="found")
 	domain_path = os.path.join(domains_dir, domain_file)
 	seq_name = domain_file.replace('.tsv', '.fasta')
 	seq_path = os.path.join(sequences_dir, seq_name)
 
 	if not check_file_valid(domain_path, seq_path):
-		stats['skipped'] += 1
+		metrics.inc(SEQUENCES_METRIC, plant=plant, status="skipped")
+		return None
+
+	# Verifica se todos os processamentos já foram feitos (uma consulta ao manifesto)
+	done = manifest.completed_steps(plant, [seq_name.replace('.fasta', '')])[seq_name.replace('.fasta', '')]
+	if any(operation_step(operation, num) not in done for operation, num in [(None, None)] + OPERATIONS):
+		return seq_name
+
+	metrics.inc(SEQUENCES_METRIC, plant=plant, status="already_processed")
+	logging.info(f"TUDO PROCESSADO: {plant}/{seq_name}")
+	return None
+
+def process_sequence(domain_file, plant, domains_dir, sequences_dir):
+	seq_name = pending_sequence(domain_file, plant, domains_dir, sequences_dir)
+	if seq_name is None:
+		metrics.flush()
 		return
-	
-	# Verifica se todos os processamentos já foram feitos
-	all_processed = True
-	required_operations = [
-		(None, None),  # Pré-processamento
-	] + [
-		("mapping", num) for num in NUMERICAL_REPRESENTATIONS
-	] + [
-		("chaos", num) for num in CHAOS_APPROACHES
-	] + [
-		("fourier", num) for num in NUMERICAL_REPRESENTATIONS
-	] + [
-		("entropy", num) for num in ENTROPY_TYPES
-	] + [
-		("complex_networks", None),
-		("k-mer", None)
-	] + [
-		("anf", num) for num in ANF_TYPES
-	] + [
-		("orf", None),
-		("fickett_score", None)
-	]
 
-	for operation, num in required_operations:
-		if not is_already_processed(plant, seq_name, operation, num):
-			all_processed = False
-			break
-	
-	if all_processed:
-		stats['already_processed'] += 1
-		logging.info(f"TUDO PROCESSADO: {plant}/{seq_name}")
+	# Executa os processamentos necessários (falhas de cada operação são contadas em run_operation)
+	if not run_operation(plant, seq_name):
+		metrics.inc(SEQUENCES_METRIC, plant=plant, status="failed")
+		metrics.flush()
 		return
 
-	# Executa os processamentos necessários
 	seq_success = True
-	
-	if not run_preprocessing(plant, seq_name):
-		seq_success = False
-		stats['failed'] += 1
-	else:
-		# Processa Mapeamentos Numéricos
-		for num in NUMERICAL_REPRESENTATIONS:
-			if not run_numerical_mapping(plant, seq_name, num):
-				seq_success = False
-				stats['failed'] += 1
-
-		# Processa Chaos Game
-		for approach_num in CHAOS_APPROACHES:
-			if not run_chaos_mapping(plant, seq_name, approach_num):
-				seq_success = False
-				stats['failed'] += 1
-
-		# Processa Fourier
-		for num in NUMERICAL_REPRESENTATIONS:
-			if not run_fourier_analysis(plant, seq_name, num):
-				seq_success = False
-				stats['failed'] += 1
-
-		# Processa Entropias
-		for entropy_type in ENTROPY_TYPES:
-			if not run_entropy_analysis(plant, seq_name, entropy_type):
-				seq_success = False
-				stats['failed'] += 1
-
-		# Processa Redes Complexas
-		if not run_complex_networks(plant, seq_name):
+	for operation, num in OPERATIONS:
+		if not run_operation(plant, seq_name, operation, num):
 			seq_success = False
-			stats['failed'] += 1
 
-		# Processa K-Mer
-		if not run_k_mer(plant, seq_name):
-			seq_success = False
-			stats['failed'] += 1
+	store_outputs(plant, [seq_name])
 
-		# Processa ANF
-		for num in ANF_TYPES:
-			if not run_accumulated_nucleotide_frequency(plant, seq_name, num):
-				seq_success = False
-				stats['failed'] += 1
+	metrics.inc(SEQUENCES_METRIC, plant=plant, status="processed" if seq_success else "failed")
+	metrics.flush()
 
-		# Processa ORF
-		if not run_orf(plant, seq_name):
-			seq_success = False
-			stats['failed'] += 1
+def store_outputs(plant, seq_names=None):
+	"""Grava os CSVs gerados no store colunar (quando seq_names é None, os CSVs da pasta ainda fora do store)"""
+	if not FEATURE_STORE:
+		return
 
-		# Processa Fickett Score
-		if not run_fickett_score(plant, seq_name):
-			seq_success = False
-			stats['failed'] += 1
+	for operation, num in OPERATIONS:
+		feature = operation_feature(operation, num)
+		if seq_names is None:
+			output_file = operation_output_file(plant, "", operation, num)
+			output_dir, suffix = os.path.dirname(output_file), os.path.basename(output_file)
+			if not os.path.isdir(output_dir):
+				continue
+			stored = feature_store.stored_names(DATA_DIR, plant, feature)
+			csv_paths = [os.path.join(output_dir, f) for f in sorted(os.listdir(output_dir)) if f.endswith(suffix) and f[:-len(suffix)] not in stored]
+		else:
+			csv_paths = [operation_output_file(plant, seq_name, operation, num) for seq_name in seq_names]
+			csv_paths = [csv_path for csv_path in csv_paths if os.path.exists(csv_path)]
+
+		for i in range(0, len(csv_paths), STORE_CHUNK_SIZE):
+			feature_store.ingest_csv_files(DATA_DIR, plant, feature, csv_paths[i:i + STORE_CHUNK_SIZE], remove=not KEEP_CSV_FILES)
+
+def finish_store(plant, duplicates):
+	"""Replica as features dos representantes para as cópias e compacta os parts de cada feature"""
+	if not FEATURE_STORE:
+		return
+
+	duplicates = {
+		representative.replace('.fasta', ''): [seq_name.replace('.fasta', '') for seq_name in copies]
+		for representative, copies in duplicates.items() if copies
+	}
+	for operation, num in OPERATIONS:
+		feature = operation_feature(operation, num)
+		feature_store.copy_rows(DATA_DIR, plant, feature, duplicates)
+		feature_store.compact(DATA_DIR, plant, feature)
+
+		# Cópias que ganharam as linhas do representante passam a constar como feitas no manifesto
+		copied = [seq_name for copies in duplicates.values() for seq_name in copies if feature_store.contains(DATA_DIR, plant, feature, seq_name)]
+		manifest.record_many(plant, [(seq_name, operation_step(operation, num), manifest.SUCCESS, feature_store.feature_dir(DATA_DIR, plant, feature), None, time.time()) for seq_name in copied])
+
+def fan_out_outputs(plant, representative, copies):
+	"""Replica as saídas de um representante para as sequências idênticas a ele"""
+	representative_name = representative.replace('.fasta', '')
+	for operation, num in [(None, None)] + OPERATIONS:
+		src_path = operation_output_file(plant, representative, operation, num)
+		if not os.path.exists(src_path):
+			continue
+
+		fanned_out = []
+		for seq_name in copies:
+			if not is_already_processed(plant, seq_name, operation, num):
+				dst_path = operation_output_file(plant, seq_name, operation, num)
+				sequence_dedup.fan_out(src_path, dst_path, representative_name, seq_name.replace('.fasta', ''))
+				fanned_out.append(seq_name)
+		record_outputs(plant, fanned_out, operation, num)
+
+def fasta_sequence_length(fasta_path):
+	"""Retorna o total de nucleotídeos de um arquivo FASTA"""
+	with open(fasta_path, "r") as f:
+		return sum(len(line.strip()) for line in f if not line.startswith(">"))
 
-		if seq_success:
-			stats['processed'] += 1
+def split_batch_fasta(batch_fasta):
+	"""Separa um multi-FASTA em {nome: linhas do registro}, preservando o texto original"""
+	records = {}
+	lines = None
+	with open(batch_fasta, "r") as f:
+		for line in f:
+			if line.startswith(">"):
+				lines = records.setdefault(line[1:].split(maxsplit=1)[0] if line[1:].strip() else "", [])
+			if lines is not None:
+				lines.append(line)
+	return records
 
+def split_batch_csv(batch_csv, names):
+	"""Separa o CSV de um lote em {nome: linhas}, repetindo o cabeçalho em cada saída"""
+	header = []
+	rows = {}
+	with open(batch_csv, "r") as f:
+		for line in f:
+			name = line.split(",", 1)[0]
+			if name in names:
+				rows.setdefault(name, []).append(line)
+			elif not rows:
+				header.append(line)
+	return {name: header + lines for name, lines in rows.items()}
+
+def run_operation_batch(plant, seq_names, operation, num, work_dir):
+	"""Executa uma operação uma única vez para um lote de sequências e separa a saída por TE.
+
+	Retorna as sequências que não saíram do lote e precisam ser refeitas individualmente."""
+	variant = "preprocessing" if operation is None else operation if num is None else f"{operation}_{num}"
+	input_folder = "seq" if operation is None else "preprocessing"
+	batch_input = os.path.join(work_dir, f"{variant}_{len(os.listdir(work_dir))}.fasta")
+	batch_output = batch_input.replace(".fasta", ".out")
+	started = time.time()
+
+	# Concatena os TEs do lote em um único multi-FASTA
+	with open(batch_input, "w") as out_f:
+		for seq_name in seq_names:
+			with open(os.path.join(DATA_DIR, plant, input_folder, seq_name), "r") as in_f:
+				content = in_f.read()
+			out_f.write(content if content.endswith("\n") else content + "\n")
+
+	try:
+		script, args, stdin_text = operation_command(operation, num, batch_input, batch_output)
+		with tracing.span(operation_step(operation, num), "operation", species=plant, te=f"{seq_names[0].replace('.fasta', '')} ... {seq_names[-1].replace('.fasta', '')}", sequences=len(seq_names), mode="batch"):
+			run_mathfeature(script, args, stdin_text, timeout=600 * len(seq_names))
+
+		names = {seq_name.replace('.fasta', '') for seq_name in seq_names}
+		if operation is None:
+			outputs = split_batch_fasta(batch_output) if os.path.exists(batch_output) else {}
+		else:
+			outputs = split_batch_csv(batch_output, names) if os.path.exists(batch_output) else {}
+	except Exception as e:
+		logging.error(f"FALHA LOTE {variant}: {plant} ({len(seq_names)} sequências) | Erro: {str(e)}")
+		operation_metrics(plant, operation, num, "batch", started, 0, 1)
+		return list(seq_names)
+	finally:
+		gc.collect()  # Liberar memória
+
+	missing, written = [], []
+	for seq_name in seq_names:
+		output_file = operation_output_file(plant, seq_name, operation, num)
+		lines = outputs.get(seq_name.replace('.fasta', ''))
+
+		# O pré-processamento descarta sequências inválidas: o arquivo fica vazio, como no modo individual
+		if lines is None and operation is not None:
+			missing.append(seq_name)
+			continue
+
+		os.makedirs(os.path.dirname(output_file), exist_ok=True)
+		with open(output_file, "w") as f:
+			f.writelines(lines or [])
+		written.append(seq_name)
+
+	record_outputs(plant, written, operation, num, started)
+	operation_metrics(plant, operation, num, "batch", started, len(written), 0)
+	logging.info(f"SUCESSO LOTE {variant}: {plant} ({len(seq_names) - len(missing)}/{len(seq_names)} sequências)")
+	return missing
+
+def batch_groups(plant, seq_names, operation, num):
+	"""Agrupa as sequências de um lote que podem ser processadas em uma mesma chamada (nenhum grupo se não há pendentes)"""
+	if not seq_names:
+		return []
+	if num not in POSITIONAL_OPERATIONS.get(operation, ()):
+		return [seq_names]
+
+	groups = {}
+	for seq_name in seq_names:
+		length = fasta_sequence_length(operation_output_file(plant, seq_name))
+		groups.setdefault(length, []).append(seq_name)
+	return list(groups.values())
+
+def process_batch(domain_files, plant, domains_dir, sequences_dir):
+	"""Processa um lote de sequências executando cada operação uma vez para o lote inteiro"""
+	seq_names = []
+	for domain_file in domain_files:
+		seq_name = pending_sequence(domain_file, plant, domains_dir, sequences_dir)
+		if seq_name is not None:
+			seq_names.append(seq_name)
+
+	if not seq_names:
+		metrics.flush()
+		return
+
+	with tempfile.TemporaryDirectory(prefix=".batch_", dir=os.path.join(DATA_DIR, plant)) as work_dir:
+		# Pré-processamento
+		pending = [seq_name for seq_name in seq_names if not is_already_processed(plant, seq_name)]
+		if pending:
+			for seq_name in run_operation_batch(plant, pending, None, None, work_dir):
+				run_operation(plant, seq_name)
+
+		ready = []
+		for seq_name in seq_names:
+			preprocessed_file = operation_output_file(plant, seq_name)
+			if os.path.exists(preprocessed_file) and os.path.getsize(preprocessed_file) > 0:
+				ready.append(seq_name)
+			else:
+				logging.error(f"FALHA PRÉ-PROCESSAMENTO: {plant}/{seq_name} | Erro: Arquivo de saída não foi criado ou vazio")
+				metrics.inc(SEQUENCES_METRIC, plant=plant, status="failed")
+
+		# Demais operações, uma chamada por grupo do lote
+		failed = set()
+		for operation, num in OPERATIONS:
+			pending = [seq_name for seq_name in ready if not is_already_processed(plant, seq_name, operation, num)]
+			for group in batch_groups(plant, pending, operation, num):
+				retry = group if len(group) == 1 else run_operation_batch(plant, group, operation, num, work_dir)
+
+				# Refaz individualmente o que não saiu do lote
+				for seq_name in retry:
+					if not run_operation(plant, seq_name, operation, num):
+						failed.add(seq_name)
+
+		store_outputs(plant, ready)
+		metrics.inc(SEQUENCES_METRIC, len(ready) - len(failed), plant=plant, status="processed")
+		metrics.inc(SEQUENCES_METRIC, len(failed), plant=plant, status="failed")
+		metrics.flush()
 
 if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Calcula as features do MathFeature para os TEs de todas as espécies")
+	profiling.add_arguments(parser)
+	profiling.configure(parser.parse_args(), "mathfeature_processing")
+
 	start_time = datetime.now()
+	tracing.start()
 	logging.info(f"Iniciando processamento em {start_time}")
 	
-	stats = {
-		'total_sequences': 0,
-		'processed': 0,
-		'skipped': 0,
-		'failed': 0,
-		'already_processed': 0
-	}
+	# Os workers enviam contagens e durações ao processo principal, que reescreve metrics.METRICS_FILE periodicamente
+	metrics_queue = metrics.start_exporter()
 
+	# Uma única fila com os lotes de todas as espécies, executada por um pool global (scheduler)
+	tasks = []
+	plant_duplicates = {}
 	for plant in sorted(os.listdir(DATA_DIR)):
 		plant_dir = os.path.join(DATA_DIR, plant)
 		domains_dir = os.path.join(plant_dir, "domains")
@@ -754,27 +953,77 @@ if __name__ == "__main__":
 		if not os.path.exists(domains_dir) or not os.path.exists(sequences_dir):
 			continue
 
-		num_processes = max(1, cpu_count() // 2)  # Usar metade dos núcleos da CPU
+		domain_files = sorted(os.listdir(domains_dir))
+
+		# CSVs de execuções anteriores (ou interrompidas) vão para o store antes de tudo
+		store_outputs(plant)
 
-		# Lista para armazenar sequências que precisam ser processadas
-		sequences_to_process = []
+		# Sequências idênticas são processadas uma única vez, pelo representante do grupo
+		seq_names = [f.replace('.tsv', '.fasta') for f in domain_files if f.endswith('.tsv')]
+		backfill_manifest(plant, seq_names)
+		preprocessed = manifest.completed_items(plant, operation_step())
+		hash_index = sequence_dedup.load_hash_index(sequences_dir, seq_names)
+		duplicates = sequence_dedup.group_duplicates(seq_names, hash_index, prefer=lambda seq_name: seq_name.replace('.fasta', '') in preprocessed)
+		metrics.inc(SEQUENCES_METRIC, sum(len(copies) for copies in duplicates.values()), plant=plant, status="duplicate")
+		plant_duplicates[plant] = duplicates
+
+		# Sequências mais longas primeiro: os lotes juntam TEs de tamanho parecido e os mais demorados começam antes
+		seq_paths = {seq_name: os.path.join(sequences_dir, seq_name) for seq_name in duplicates}
+		seq_names = sorted(duplicates, key=lambda seq_name: scheduler.file_cost([seq_paths[seq_name]]), reverse=True)
+		domain_files = [seq_name.replace('.fasta', '.tsv') for seq_name in seq_names]
 
 		# Processa apenas as sequências que ainda não foram processadas
-		with Pool(num_processes) as pool:
-			results = pool.starmap(process_sequence, [
-				(domain_file, plant, domains_dir, sequences_dir, stats)
-				for domain_file in sorted(os.listdir(domains_dir))
-			])
-			
+		if BATCH_SIZE > 1:
+			tasks.extend(
+				scheduler.Task((plant, "features"), scheduler.file_cost([seq_paths[s] for s in seq_names[i:i + BATCH_SIZE]]), process_batch, (domain_files[i:i + BATCH_SIZE], plant, domains_dir, sequences_dir))
+				for i in range(0, len(domain_files), BATCH_SIZE)
+			)
+		else:
+			tasks.extend(
+				scheduler.Task((plant, "features"), scheduler.file_cost([seq_paths[seq_name]]), process_sequence, (domain_file, plant, domains_dir, sequences_dir))
+				for seq_name, domain_file in zip(seq_names, domain_files)
+			)
+
+	def plant_done(group, results):
+		"""Ao fim das features de uma espécie, replica os resultados para as cópias e fecha o store"""
+		plant, stage = group
+		duplicates = plant_duplicates[plant]
+		failed = scheduler.failures(results)
+		if failed:
+			logging.error(f"Espécie {plant}: {len(failed)} tarefa(s) de {stage} falharam; as sequências delas seguem pendentes no manifesto")
+		if stage == "features":
+			sequences_dir = os.path.join(DATA_DIR, plant, "seq")
+			fan_out = [
+				scheduler.Task((plant, "fan_out"), scheduler.file_cost([os.path.join(sequences_dir, representative)]) * len(copies), fan_out_outputs, (plant, representative, copies))
+				for representative, copies in duplicates.items() if copies
+			]
+			if fan_out:
+				return fan_out
+		finish_store(plant, duplicates)
+		logging.info(f"Espécie {plant} finalizada")
+
+	metrics.flush()
+	scheduler.run_tasks(tasks, plant_done, groups=[(plant, "features") for plant in plant_duplicates], initializer=init_worker, initargs=(metrics_queue,))
+	metrics.stop_exporter()
+	if tracing.finish():
+		logging.info(f"Trace salvo em {tracing.TRACE_FILE}")
+	for report in profiling.finish():
+		logging.info(f"Profile salvo em {report}")
+	totals = metrics.totals()
+
 	# Relatório final
 	end_time = datetime.now()
 	duration = end_time - start_time
 	
 	logging.info("\n=== RESUMO FINAL ===")
 	logging.info(f"Tempo total: {duration}")
-	logging.info(f"Sequências encontradas: {stats['total_sequences']}")
-	logging.info(f"Sequências processadas agora: {stats['processed']}")
-	logging.info(f"Sequências já processadas anteriormente: {stats['already_processed']}")
-	logging.info(f"Sequências ignoradas: {stats['skipped']}")
-	logging.info(f"Operações com falha: {stats['failed']}")
+	logging.info(f"Sequências encontradas: {metrics.counter_sum(totals, SEQUENCES_METRIC, status='found')}")
+	logging.info(f"Sequências processadas agora: {metrics.counter_sum(totals, SEQUENCES_METRIC, status='processed')}")
+	logging.info(f"Sequências já processadas anteriormente: {metrics.counter_sum(totals, SEQUENCES_METRIC, status='already_processed')}")
+	logging.info(f"Sequências ignoradas: {metrics.counter_sum(totals, SEQUENCES_METRIC, status='skipped')}")
+	logging.info(f"Sequências idênticas reaproveitadas: {metrics.counter_sum(totals, SEQUENCES_METRIC, status='duplicate')}")
+	logging.info(f"Sequências com falha: {metrics.counter_sum(totals, SEQUENCES_METRIC, status='failed')}")
+	logging.info(f"Operações com falha: {metrics.counter_sum(totals, FAILURES_METRIC, mode='single')}")
+	logging.info(f"Lotes refeitos individualmente: {metrics.counter_sum(totals, FAILURES_METRIC, mode='batch')}")
+	logging.info(f"Métricas salvas em: {metrics.METRICS_FILE}")
 	logging.info("Arquivo de log salvo em: mappings.log")
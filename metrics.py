@@ -0,0 +1,171 @@
+import os
+import time
+import uuid
+import queue
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+# Arquivo no formato texto do Prometheus (node_exporter --collector.textfile ou leitura direta), reescrito
+# a cada EXPORT_INTERVAL segundos enquanto o pipeline roda
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics.prom")
+EXPORT_INTERVAL = float(os.environ.get("METRICS_INTERVAL", 30))
+
+# Limites (segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+
+def new_registry():
+	"""Registro vazio: counters {(nome, labels): valor} e histograms {(nome, labels): [buckets..., soma, total]}"""
+	return {"counters": {}, "histograms": {}}
+
+# Deltas do processo atual ainda não enviados ao processo principal
+_pending = new_registry()
+_queue = None
+
+# Agregado de todos os processos (só no processo principal, com o exportador ativo)
+_total = new_registry()
+_lock = threading.Lock()
+_exporter = None
+
+def _key(name, labels):
+	return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+	"""Soma value a um contador"""
+	key = _key(name, labels)
+	_pending["counters"][key] = _pending["counters"].get(key, 0) + value
+
+def observe(name, seconds, **labels):
+	"""Registra uma duração em um histograma"""
+	key = _key(name, labels)
+	histogram = _pending["histograms"].setdefault(key, [0] * (len(LATENCY_BUCKETS) + 3))
+	bucket = next((i for i, limit in enumerate(LATENCY_BUCKETS) if seconds <= limit), len(LATENCY_BUCKETS))
+	histogram[bucket] += 1
+	histogram[-2] += seconds
+	histogram[-1] += 1
+
+@contextmanager
+def timer(name, **labels):
+	"""Mede o bloco e registra a duração em um histograma"""
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		observe(name, time.perf_counter() - start, **labels)
+
+def merge(target, source):
+	"""Soma os contadores e histogramas de source em target"""
+	for key, value in source["counters"].items():
+		target["counters"][key] = target["counters"].get(key, 0) + value
+	for key, values in source["histograms"].items():
+		histogram = target["histograms"].setdefault(key, [0] * len(values))
+		for i, value in enumerate(values):
+			histogram[i] += value
+
+def flush():
+	"""Envia os deltas acumulados ao processo principal (nos workers) ou ao agregado (no próprio principal)"""
+	global _pending
+	if not _pending["counters"] and not _pending["histograms"]:
+		return
+	snapshot, _pending = _pending, new_registry()
+	if _queue is not None:
+		_queue.put(snapshot)
+	else:
+		with _lock:
+			merge(_total, snapshot)
+
+def init_worker(metrics_queue):
+	"""Initializer dos workers: as métricas passam a ser enviadas pela fila do exportador"""
+	global _queue, _pending
+	_queue = metrics_queue
+	_pending = new_registry()  # Descarta o que foi herdado do processo principal (fork)
+
+def _escape(value):
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels, extra=()):
+	items = list(labels) + list(extra)
+	return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}" if items else ""
+
+def render(registry):
+	"""Texto no formato de exposição do Prometheus"""
+	lines = []
+	typed = set()
+	for (name, labels), value in sorted(registry["counters"].items()):
+		if name not in typed:
+			lines.append(f"# TYPE {name} counter")
+			typed.add(name)
+		lines.append(f"{name}{_labels(labels)} {value}")
+	for (name, labels), values in sorted(registry["histograms"].items()):
+		if name not in typed:
+			lines.append(f"# TYPE {name} histogram")
+			typed.add(name)
+		cumulative = 0
+		for limit, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], values):
+			cumulative += count
+			lines.append(f"{name}_bucket{_labels(labels, [('le', limit)])} {cumulative}")
+		lines.append(f"{name}_sum{_labels(labels)} {values[-2]}")
+		lines.append(f"{name}_count{_labels(labels)} {values[-1]}")
+	return "\n".join(lines) + "\n"
+
+def write(registry, path=METRICS_FILE):
+	"""Grava o arquivo de forma atômica (o coletor nunca lê um arquivo pela metade)"""
+	directory = os.path.dirname(os.path.abspath(path))
+	os.makedirs(directory, exist_ok=True)
+	tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+	with open(tmp_path, "w") as f:
+		f.write(render(registry))
+	os.replace(tmp_path, path)
+
+def _snapshot():
+	with _lock:
+		snapshot = new_registry()
+		merge(snapshot, _total)
+	return snapshot
+
+def totals():
+	"""Cópia do agregado (inclui os deltas ainda não enviados do processo principal)"""
+	flush()
+	return _snapshot()
+
+def counter_sum(registry, name, **labels):
+	"""Soma de um contador sobre todas as séries cujos labels contêm os informados"""
+	wanted = set(labels.items())
+	return sum(value for (counter, series), value in registry["counters"].items() if counter == name and wanted <= set(series))
+
+def start_exporter(path=METRICS_FILE, interval=EXPORT_INTERVAL):
+	"""Inicia a thread que recebe as métricas dos workers e reescreve o arquivo periodicamente.
+
+	Retorna a fila que deve ser passada a init_worker (initargs do pool)."""
+	global _exporter
+	metrics_queue = multiprocessing.Queue()
+	stop = threading.Event()
+
+	def run():
+		last_export = 0.0
+		while not stop.is_set() or not metrics_queue.empty():
+			try:
+				snapshot = metrics_queue.get(timeout=1)
+				with _lock:
+					merge(_total, snapshot)
+			except queue.Empty:
+				pass
+			if time.monotonic() - last_export >= interval:
+				write(_snapshot(), path)  # Os deltas do processo principal entram no próximo flush() dele
+				last_export = time.monotonic()
+
+	thread = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+	thread.start()
+	_exporter = (thread, stop, path)
+	return metrics_queue
+
+def stop_exporter():
+	"""Encerra o exportador (depois que os workers terminaram) e grava o arquivo final"""
+	global _exporter
+	if _exporter is None:
+		return
+	thread, stop, path = _exporter
+	stop.set()
+	thread.join()
+	write(totals(), path)
+	_exporter = None
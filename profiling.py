@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import shutil
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+# Pasta dos relatórios de --profile: <nome>.pstats (todos os processos juntos), <nome>.txt e <nome>_memory.txt
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+# Linhas de cada relatório
+TOP_N = 30
+
+# Configuração herdada pelos workers (fork ou spawn) através do ambiente
+_ENV = "PIPELINE_PROFILE"
+
+_profiler = None
+_profiler_pid = None
+_memory_tasks = []
+_memory_sites = {}
+
+def add_arguments(parser):
+	"""Opções de linha de comando comuns aos scripts do pipeline"""
+	parser.add_argument("--profile", action="store_true", help=f"Perfila as tarefas (cProfile) e grava os relatórios em {PROFILE_DIR}/")
+	parser.add_argument("--profile-memory", action="store_true", help="Com --profile, registra também as alocações (tracemalloc)")
+	parser.add_argument("--profile-top", type=int, default=TOP_N, help="Quantidade de linhas dos relatórios")
+
+def _settings():
+	value = os.environ.get(_ENV)
+	return json.loads(value) if value else None
+
+def _parts_dir(settings):
+	return os.path.join(settings["dir"], f".{settings['name']}.parts")
+
+def configure(args, name):
+	"""Liga o profiling no processo principal e nos workers criados depois desta chamada.
+
+	O tracemalloc só é ligado nos workers, dentro de task(): o processo principal não gera relatório de memória."""
+	if not args.profile:
+		os.environ.pop(_ENV, None)
+		return
+	settings = {"name": name, "dir": PROFILE_DIR, "memory": args.profile_memory, "top": args.profile_top}
+	os.environ[_ENV] = json.dumps(settings)
+	shutil.rmtree(_parts_dir(settings), ignore_errors=True)
+	os.makedirs(_parts_dir(settings))
+	_process_profiler(settings).enable()  # Trabalho feito no próprio processo principal (leituras, callbacks)
+
+def _process_profiler(settings):
+	"""Profiler do processo atual. Depois de um fork, descarta o herdado do processo principal (que segue ativo na thread)"""
+	global _profiler, _profiler_pid, _memory_tasks, _memory_sites
+	if _profiler_pid != os.getpid():
+		if _profiler is not None:
+			_profiler.disable()
+		_profiler, _profiler_pid = cProfile.Profile(), os.getpid()
+		_memory_tasks, _memory_sites = [], {}
+	return _profiler
+
+def _record_memory(settings, name, group, seconds):
+	"""Pico da tarefa e maiores sítios de alocação ainda vivos ao fim dela (memória retida por caches, resultados...)"""
+	peak = tracemalloc.get_traced_memory()[1]
+	snapshot = tracemalloc.take_snapshot().filter_traces([
+		tracemalloc.Filter(False, tracemalloc.__file__),
+		tracemalloc.Filter(False, cProfile.__file__),
+		tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+	])
+	for stat in snapshot.statistics("lineno")[:settings["top"]]:
+		site = str(stat.traceback[0])
+		_memory_sites[site] = max(_memory_sites.get(site, 0), stat.size)
+	_memory_tasks.append([name, str(group), peak, seconds])
+
+	with open(os.path.join(_parts_dir(settings), f"{os.getpid()}.json"), "w") as f:
+		json.dump({"tasks": _memory_tasks, "sites": _memory_sites}, f)
+
+@contextmanager
+def task(name, group=None):
+	"""Perfila uma tarefa do worker; o profile acumulado do processo é regravado ao fim de cada tarefa"""
+	settings = _settings()
+	if settings is None:
+		yield
+		return
+
+	profiler = _process_profiler(settings)
+	if settings["memory"]:
+		if not tracemalloc.is_tracing():
+			tracemalloc.start()
+		tracemalloc.reset_peak()
+	start = time.perf_counter()
+	profiler.enable()
+	try:
+		yield
+	finally:
+		profiler.disable()
+		profiler.dump_stats(os.path.join(_parts_dir(settings), f"{os.getpid()}.prof"))
+		if settings["memory"]:
+			_record_memory(settings, name, group, time.perf_counter() - start)
+
+@contextmanager
+def paused():
+	"""Suspende o profiler do processo principal (ex.: enquanto ele só espera pelos workers ou cria o pool)"""
+	active = _profiler is not None and _profiler_pid == os.getpid() and _settings() is not None
+	if active:
+		_profiler.disable()
+	try:
+		yield
+	finally:
+		if active:
+			_profiler.enable()
+
+def _memory_report(settings, parts):
+	"""Junta os registros de memória dos workers: tarefas de maior pico e maiores sítios de alocação"""
+	tasks, sites = [], {}
+	for part in parts:
+		with open(part, "r") as f:
+			data = json.load(f)
+		tasks.extend(data["tasks"])
+		for site, size in data["sites"].items():
+			sites[site] = max(sites.get(site, 0), size)
+
+	top = settings["top"]
+	lines = [f"Tarefas com maior pico de memória (top {top})", ""]
+	for name, group, peak, seconds in sorted(tasks, key=lambda t: t[2], reverse=True)[:top]:
+		lines.append(f"{peak / 2**20:10.1f} MiB  {seconds:10.2f} s  {name} {group}")
+	lines += ["", f"Maiores sítios de alocação retidos ao fim das tarefas (top {top})", ""]
+	for site, size in sorted(sites.items(), key=lambda s: s[1], reverse=True)[:top]:
+		lines.append(f"{size / 2**20:10.1f} MiB  {site}")
+	return "\n".join(lines) + "\n"
+
+def finish():
+	"""Junta os profiles de todos os processos em PROFILE_DIR e retorna os arquivos gerados (ou [] sem --profile)"""
+	settings = _settings()
+	if settings is None or not os.path.isdir(_parts_dir(settings)):
+		return []
+	if _profiler is not None and _profiler_pid == os.getpid():
+		_profiler.disable()
+		_profiler.dump_stats(os.path.join(_parts_dir(settings), f"{os.getpid()}.prof"))
+
+	parts_dir = _parts_dir(settings)
+	prof_parts = sorted(os.path.join(parts_dir, f) for f in os.listdir(parts_dir) if f.endswith(".prof"))
+	memory_parts = sorted(os.path.join(parts_dir, f) for f in os.listdir(parts_dir) if f.endswith(".json"))
+	base = os.path.join(settings["dir"], settings["name"])
+	written = []
+
+	if prof_parts:
+		stats = pstats.Stats(*prof_parts)
+		stats.dump_stats(f"{base}.pstats")
+		with open(f"{base}.txt", "w") as f:
+			stats.stream = f
+			f.write(f"Profile de {len(prof_parts)} processos (abra {base}.pstats com pstats ou snakeviz)\n\n")
+			stats.sort_stats("cumulative").print_stats(settings["top"])
+			stats.sort_stats("tottime").print_stats(settings["top"])
+		written += [f"{base}.pstats", f"{base}.txt"]
+
+	if memory_parts:
+		with open(f"{base}_memory.txt", "w") as f:
+			f.write(_memory_report(settings, memory_parts))
+		written.append(f"{base}_memory.txt")
+
+	shutil.rmtree(parts_dir, ignore_errors=True)
+	return written
@@ -0,0 +1,169 @@
+import os
+import time
+import heapq
+import queue
+import logging
+import itertools
+import threading
+from collections import namedtuple
+from multiprocessing import Pool, SimpleQueue, cpu_count
+import tracing
+import profiling
+
+# Processos do pool global (metade dos núcleos da CPU, como antes em cada espécie)
+NUM_PROCESSES = max(1, cpu_count() // 2)
+
+# Tarefas enviadas ao pool além das que estão executando: mantém os workers ocupados sem perder a
+# prioridade das tarefas que ainda vão chegar (as de continuação, por exemplo)
+QUEUED_PER_PROCESS = 1
+
+# Intervalo (s) entre as verificações de workers que morreram no meio de uma tarefa (OOM, sinal...):
+# o pool repõe o processo, mas o callback da tarefa nunca chega
+WORKER_CHECK_INTERVAL = 5
+
+# Prazo (s) para os workers encerrarem sozinhos no fim da execução (entregando o que ainda têm em filas,
+# como as métricas) antes do terminate(): um worker preso, por exemplo em um script do MathFeature que
+# ignorou o alarme, não pode segurar o fim do pipeline
+JOIN_TIMEOUT = int(os.environ.get("SCHEDULER_JOIN_TIMEOUT", 60))
+
+# Uma unidade de trabalho: group identifica a espécie/etapa, cost ordena a fila (maiores primeiro)
+Task = namedtuple("Task", ["group", "cost", "function", "args"])
+
+# Resultado de uma tarefa que falhou (exceção ou worker morto); fica entre os resultados do grupo
+TaskFailure = namedtuple("TaskFailure", ["task", "error"])
+
+# Fila em que cada worker avisa (tarefa, pid) ao começar uma tarefa
+_started = None
+
+def file_cost(paths):
+	"""Custo de uma tarefa: soma dos tamanhos dos arquivos (arquivos ausentes contam 0)"""
+	return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def failures(results):
+	"""Tarefas que falharam entre os resultados de um grupo"""
+	return [result for result in results if isinstance(result, TaskFailure)]
+
+def _init_worker(started, initializer, initargs):
+	global _started
+	_started = started
+	if initializer is not None:
+		initializer(*initargs)
+
+def _run_task(task_id, function, args, group):
+	"""Executa uma tarefa no worker (com um span do trace e o profiler, quando ligados)"""
+	_started.put((task_id, os.getpid()))
+	with tracing.span(function.__name__, "task", group=group), profiling.task(function.__name__, group):
+		return function(*args)
+
+def _alive(pid):
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		pass
+	return True
+
+def run_tasks(tasks, group_done=None, groups=(), processes=NUM_PROCESSES, initializer=None, initargs=()):
+	"""Executa as tarefas de todas as espécies em um único pool, sempre a de maior custo primeiro.
+
+	Quando todas as tarefas de um grupo terminam, group_done(grupo, resultados) é chamado no processo
+	principal e pode retornar novas tarefas (de outros grupos), que entram na mesma fila. Grupos em
+	`groups` sem nenhuma tarefa são encerrados logo no início. Uma tarefa que falha (exceção ou worker
+	morto) é registrada no log e entra nos resultados do grupo como TaskFailure; as demais seguem.
+	Retorna {grupo: resultados}."""
+	order = itertools.count()  # Desempate estável entre tarefas de mesmo custo
+	task_ids = itertools.count()
+	heap = []
+	pending = {}
+	results = {}
+	finished = queue.Queue()
+	started = SimpleQueue()
+	running = {}  # id da tarefa -> [tarefa, pid do worker (depois que ela começa)]
+
+	def push(new_tasks):
+		for task in new_tasks or ():
+			heapq.heappush(heap, (-task.cost, next(order), task))
+			pending[task.group] = pending.get(task.group, 0) + 1
+			results.setdefault(task.group, [])
+
+	def close(group):
+		results.setdefault(group, [])
+		if group_done is not None:
+			with tracing.span("group_done", "scheduler", group=group):
+				push(group_done(group, results[group]))
+
+	push(tasks)
+	for group in groups:
+		if group not in pending:
+			close(group)
+
+	def done(task_id, result, error):
+		if task_id not in running:
+			return
+		task, _ = running.pop(task_id)
+		if error is not None:
+			logging.error(f"Tarefa {task.function.__name__} de {task.group} falhou: {error!r}", exc_info=error)
+			result = TaskFailure(task, error)
+		results[task.group].append(result)
+		pending[task.group] -= 1
+		if not pending[task.group]:
+			del pending[task.group]
+			close(task.group)
+
+	def lost_tasks():
+		"""Tarefas cujo worker morreu antes de responder"""
+		while not started.empty():
+			task_id, pid = started.get()
+			if task_id in running:
+				running[task_id][1] = pid
+		return [task_id for task_id, (_, pid) in running.items() if pid is not None and not _alive(pid)]
+
+	with profiling.paused():  # Os workers não herdam o profiler do processo principal ligado
+		pool = Pool(processes, initializer=_init_worker, initargs=(started, initializer, initargs))
+	with pool:
+		last_check = time.monotonic()
+		workers_lost = False
+		while heap or running:
+			while heap and len(running) < processes * (1 + QUEUED_PER_PROCESS):
+				_, _, task = heapq.heappop(heap)
+				task_id = next(task_ids)
+				running[task_id] = [task, None]
+				pool.apply_async(
+					_run_task, (task_id, task.function, task.args, task.group),
+					callback=lambda result, task_id=task_id: finished.put((task_id, result, None)),
+					error_callback=lambda error, task_id=task_id: finished.put((task_id, None, error)),
+				)
+
+			try:
+				with profiling.paused():  # A espera pelos workers não entra no profile do processo principal
+					item = finished.get(timeout=WORKER_CHECK_INTERVAL)
+			except queue.Empty:
+				pass
+			else:
+				done(*item)
+
+			if time.monotonic() - last_check >= WORKER_CHECK_INTERVAL:
+				last_check = time.monotonic()
+				lost = lost_tasks()
+				while not finished.empty():  # Respostas que chegaram antes de o worker morrer
+					done(*finished.get())
+				for task_id in lost:
+					if task_id in running:
+						workers_lost = True
+						done(task_id, None, RuntimeError(f"o worker {running[task_id][1]} morreu durante a tarefa"))
+
+		# Encerra os workers normalmente (em vez do terminate() do with), para que o que eles
+		# ainda tenham em filas (métricas, por exemplo) seja entregue, mas com prazo. Com uma tarefa
+		# perdida por um worker morto o join() nunca retornaria (ela segue pendente no pool)
+		if not workers_lost:
+			pool.close()
+			joiner = threading.Thread(target=pool.join, name="pool-join", daemon=True)
+			joiner.start()
+			with profiling.paused():
+				joiner.join(JOIN_TIMEOUT)
+			if joiner.is_alive():
+				logging.warning(f"Workers não encerraram em {JOIN_TIMEOUT} s; finalizando o pool")
+		pool.terminate()
+
+	return results
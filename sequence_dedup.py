@@ -0,0 +1,73 @@
+import os
+import hashlib
+
+# Índice "<arquivo .fasta>\t<hash>" mantido em data/<espécie>/
+HASH_INDEX_FILE = "seq_hashes.tsv"
+
+def sequence_hash(fasta_path):
+	"""Calcula o hash (SHA-1) do conteúdo de uma sequência, ignorando cabeçalho, quebras de linha e caixa"""
+	digest = hashlib.sha1()
+	with open(fasta_path, "r") as f:
+		for line in f:
+			if not line.startswith(">"):
+				digest.update(line.strip().upper().encode())
+	return digest.hexdigest()
+
+def load_hash_index(sequences_folder, sequence_files=None):
+	"""Retorna {arquivo: hash} das sequências, calculando apenas as que ainda não estão no índice"""
+	index_path = os.path.join(os.path.dirname(os.path.normpath(sequences_folder)), HASH_INDEX_FILE)
+	index = {}
+	if os.path.exists(index_path):
+		with open(index_path, "r") as f:
+			for line in f:
+				sequence_file, digest = line.rstrip("\n").split("\t")
+				index[sequence_file] = digest
+
+	if sequence_files is None:
+		sequence_files = [f for f in sorted(os.listdir(sequences_folder)) if f.endswith(".fasta")]
+
+	new_entries = {}
+	for sequence_file in sequence_files:
+		if sequence_file not in index:
+			sequence_path = os.path.join(sequences_folder, sequence_file)
+			if os.path.exists(sequence_path):
+				new_entries[sequence_file] = sequence_hash(sequence_path)
+
+	if new_entries:
+		with open(index_path, "a") as f:
+			for sequence_file, digest in new_entries.items():
+				f.write(f"{sequence_file}\t{digest}\n")
+		index.update(new_entries)
+
+	return index
+
+def group_duplicates(sequence_files, hash_index, prefer=None):
+	"""Agrupa sequências de mesmo conteúdo em {representante: [cópias]}.
+
+	O representante é o primeiro arquivo que satisfaz `prefer` (ex.: já processado), ou o primeiro do grupo."""
+	groups = {}
+	for sequence_file in sequence_files:
+		groups.setdefault(hash_index.get(sequence_file, sequence_file), []).append(sequence_file)
+
+	duplicates = {}
+	for members in groups.values():
+		representative = next((m for m in members if prefer is not None and prefer(m)), members[0])
+		duplicates[representative] = [m for m in members if m != representative]
+	return duplicates
+
+def _renamed_line(line, src_name, dst_name):
+	"""Troca o nome da sequência no início de uma linha (CSV, TSV ou cabeçalho FASTA)"""
+	prefix = ">" if line.startswith(">") else ""
+	start = len(prefix) + len(src_name)
+	if line.startswith(prefix + src_name) and (line[start:start + 1] in ("", ",", "\t", " ", "\n") or line.startswith("_orf", start)):
+		return prefix + dst_name + line[start:]
+	return line
+
+def fan_out(src_path, dst_path, src_name, dst_name):
+	"""Replica a saída calculada para o representante em uma cópia, trocando o nome da sequência"""
+	os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+	tmp_path = f"{dst_path}.tmp"
+	with open(src_path, "r") as in_f, open(tmp_path, "w") as out_f:
+		for line in in_f:
+			out_f.write(_renamed_line(line, src_name, dst_name))
+	os.replace(tmp_path, dst_path)
@@ -1,90 +1,94 @@
 import os
-import pandas as pd
-from multiprocessing import Pool, cpu_count
+import argparse
 import gc
+import contextlib
 import time
+import sequence_dedup
+import genome_index
+import gff3
+import scheduler
+import manifest
+import tracing
+import profiling
+
+# Etapa do pipeline no manifesto (o antigo data/status.txt é importado na primeira execução)
+STAGE = "split"
+LEGACY_STATUS_FILE = os.path.join("data", "status.txt")
+
+# Etapa de cada TE extraído no manifesto
+SEQ_STEP = "seq"
 
 # Função para ler o status das espécies e adicionar novas espécies com status 0
 def read_status(species_list):
-	status = {}
-	
-	# Se o arquivo de status não existir, cria um novo com todas as espécies como não processadas (0)
-	if not os.path.exists(status_file):
-		with open(status_file, "w") as f:
-			for species in species_list:
-				f.write(f"{species}:0\n")
-				status[species] = 0
-	else:
-		# Se o arquivo existir, lê o status atual
-		with open(status_file, "r") as f:
-			lines = f.readlines()
-			existing_species = set()
-			for line in lines:
-				species, state = line.strip().split(":")
-				status[species] = int(state)
-				existing_species.add(species)
-		
-		# Verifica se há novas espécies que não estão no arquivo de status
-		new_species = set(species_list) - existing_species
-		if new_species:
-			with open(status_file, "a") as f:
-				for species in new_species:
-					f.write(f"{species}:0\n")
-					status[species] = 0
-	
-	return status
+	return manifest.species_status(STAGE, species_list, LEGACY_STATUS_FILE)
 
 # Função para atualizar o status de uma espécie
 def update_status(species, state):
-	status = {}
-	if os.path.exists(status_file):
-		with open(status_file, "r") as f:
-			for line in f:
-				s, st = line.strip().split(":")
-				status[s] = int(st)
-	
-	status[species] = state
-	
-	with open(status_file, "w") as f:
-		for s, st in status.items():
-			f.write(f"{s}:{st}\n")
-
-def process_sequence(fasta_file, species_name, fasta_folder, output_folder, df_sorted):
+	manifest.set_species_status(STAGE, species, state)
+
+def process_sequence(fasta_file, species_name, fasta_folder, output_folder, starts, ends):
 	# Timer para o cromossomo
 	chromosome_start_time = time.time()
 
 	fasta_path = os.path.join(fasta_folder, fasta_file)
 
-	with open(fasta_path, "r") as f:
-		fasta_data = f.readlines()
-
-	# Ignorar a primeira linha e juntar todas as sequências
-	full_sequence = "".join(line.strip() for line in fasta_data[1:])
-
-	# Gerar os arquivos segmentados
-	for row in df_sorted.itertuples(index=False):
-		if fasta_file.replace(".fasta", "") != row.Chr:
-			return
-
-		chr_name, start, end = row.Chr, row.Start, row.End
+	# Índice .fai (construído uma única vez por cromosomo) + mmap: só as regiões dos TEs são lidas
+	try:
+		index = genome_index.load_index(fasta_path)
+		source = genome_index.mapped_fasta(fasta_path)
+	except ValueError as e:
+		# Linhas de tamanho irregular: o cromossomo é lido inteiro, como antes do índice
+		print(f"{e}. Lendo {fasta_path} inteiro...")
+		entry, sequence = genome_index.read_sequence(fasta_path)
+		index = {entry.name: entry} if entry is not None else {}
+		source = contextlib.nullcontext(sequence)
+	if not index:
+		print(f"Arquivo {fasta_path} não contém sequências. Pulando...")
+		return
+	entry = next(iter(index.values()))
+
+	chr_name = fasta_file.replace(".fasta", "")
+	existing = 0
+	out_of_range = 0
+
+	# TEs deste cromossomo já extraídos, em uma única consulta ao manifesto
+	done = manifest.completed_items(species_name, SEQ_STEP, f"{chr_name}_")
+	rows = []
+
+	# Intervalos já vêm ordenados por início: uma única passada sequencial pelo cromossomo
+	with tracing.span("split", "chromosome", species=species_name, chromosome=chr_name, tes=len(starts)), source as mapped:
+		# Gerar os arquivos segmentados
+		for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+			if start > entry.length:
+				out_of_range += len(starts) - i  # Os demais também estão fora
+				break
+			if end > entry.length:
+				out_of_range += 1
+				continue
+
+			item = f"{chr_name}_{start}_{end}"
+			output_path = os.path.join(output_folder, f"{item}.fasta")
+			if item in done:
+				existing += 1
+				continue
+			if os.path.exists(output_path):  # Extraído antes do manifesto existir
+				existing += 1
+				rows.append((item, SEQ_STEP, manifest.SUCCESS, output_path, None, None))
+				continue
+
+			item_start_time = time.time()
+			subseq = genome_index.fetch(mapped, entry, start, end)
+			with open(output_path, "w") as out_f:
+				out_f.write(f">{item}\n{subseq}\n")
+			rows.append((item, SEQ_STEP, manifest.SUCCESS, output_path, item_start_time, time.time()))
+
+	manifest.record_many(species_name, rows)
+
+	if existing:
+		print(f"Cromossomo {species_name}/{chr_name}: {existing} arquivos já existiam. Pulando...")
+	if out_of_range:
+		print(f"Cromossomo {species_name}/{chr_name}: {out_of_range} intervalos fora do tamanho do cromossomo ({entry.length}).")
 
-		if start > len(full_sequence) or end > len(full_sequence):
-			return
-
-		subseq = full_sequence[start-1:end]
-		output_path = os.path.join(output_folder, f"{chr_name}_{start}_{end}.fasta")
-		if os.path.exists(output_path):
-			print(f"Arquivo {output_path} já existe. Pulando...")
-			return
-
-		with open(output_path, "w") as out_f:
-			out_f.write(f">{chr_name}_{start}_{end}\n{subseq}\n")
-
-		# Liberar memória imediatamente após o uso
-		del subseq
-
-	# Liberar memória após processar o arquivo FASTA
-	del full_sequence
 	gc.collect()
 
 	# Timer para o cromossomo
@@ -92,28 +96,30 @@ def process_sequence(fasta_file, species_name, fasta_folder, output_folder, df_s
 	print(f"Cromossomo {species_name}/{fasta_file.replace('.fasta', '')} processado em {chromosome_end_time - chromosome_start_time:.2f} segundos.")
 
 if __name__ == "__main__":
-	# Lista de todas as espécies na pasta "data"
-	species_list = sorted(os.listdir("data"))
+	parser = argparse.ArgumentParser(description="Extrai as sequências dos TEs de cada cromossomo")
+	profiling.add_arguments(parser)
+	profiling.configure(parser.parse_args(), "split_cromosome")
 
 	data_folder = "data"
-	for species_name in species_list:
-		if species_name == "status.txt":
-			print("Processamento Finalizado!")
-			continue
+	tracing.start()
 
-		# Caminho do arquivo de controle
-		status_file = os.path.join("data", "status.txt")
+	# Lista de todas as espécies na pasta "data" (ignora arquivos, como o manifesto, e pastas ocultas)
+	species_list = sorted(d for d in os.listdir(data_folder) if os.path.isdir(os.path.join(data_folder, d)) and not d.startswith("."))
 
+	# Cromossomos de todas as espécies em uma única fila (os maiores primeiro), executada por um pool global
+	tasks = []
+	species_start_times = {}
+	for species_name in species_list:
 		# Ler o status atual e adicionar novas espécies, se necessário
 		status = read_status(species_list)
 
 		# Verificar se a espécie já foi processada
-		if status.get(species_name, 0) == 1 or status.get(species_name, 0) == -1:
+		if status.get(species_name, manifest.WAITING) in (manifest.SUCCESS, manifest.PROCESSING):
 			print(f"Espécie {species_name} já foi ou está sendo processada. Pulando...")
 			continue
 
 		# Atualizar o status da espécie para "processando"
-		update_status(species_name, -1)
+		update_status(species_name, manifest.PROCESSING)
 
 		# Timer para a espécie
 		species_start_time = time.time()
@@ -123,26 +129,10 @@ if __name__ == "__main__":
 
 		os.makedirs(output_folder, exist_ok=True)
 
-		# Definir os nomes das colunas do arquivo GFF3
-		column_names = ["Chr", "SourceAnnotation", "COS", "Start", "End", "Score", "Strand", "Phase", "Attributes"]
-
-		# Lista para armazenar os dados do novo arquivo
-		data = []
-
 		gff3_path = os.path.join(data_folder, species_name, f"{species_name}_TER_merged.gff3")
 		try:
-			chunk_size = 10000  # Ajuste conforme necessário
-			chunks = pd.read_csv(gff3_path, sep='\t', comment='#', header=None, names=column_names, chunksize=chunk_size)
-
-			df_list = []
-			for chunk in chunks:
-				chunk["Start"] = chunk["Start"].astype(int)
-				chunk["End"] = chunk["End"].astype(int)
-				df_list.append(chunk)
-
-			# Concatenar todos os chunks em um único DataFrame
-			df = pd.concat(df_list)
-			df_sorted = df.sort_values(by=['Chr']).reset_index(drop=True)
+			# Intervalos por cromossomo (arrays de início/fim ordenados): cada worker recebe apenas os seus
+			intervals, classes = gff3.read_intervals(gff3_path)
 
 		except FileNotFoundError:
 			print(f"Erro: Arquivo {gff3_path} não encontrado!")
@@ -151,24 +141,36 @@ if __name__ == "__main__":
 			print(f"Erro ao processar {gff3_path}: {e}")
 			continue
 
-		num_processes = max(1, cpu_count() // 2)  # Usar metade dos núcleos da CPU
-
-
 		# Processar os arquivos FASTA
-		with Pool(num_processes) as pool:
-			results = pool.starmap(process_sequence, [
-				(fasta_file, species_name, fasta_folder, output_folder, df_sorted)
-				for fasta_file in sorted(os.listdir(fasta_folder))
-			])
-
-
-		# Liberar memória após processar a espécie
-		del df, df_sorted
+		tasks.extend(
+			scheduler.Task(species_name, scheduler.file_cost([os.path.join(fasta_folder, fasta_file)]), process_sequence, (fasta_file, species_name, fasta_folder, output_folder, *intervals[fasta_file.replace(".fasta", "")][:2]))
+			for fasta_file in sorted(os.listdir(fasta_folder))
+			if fasta_file.endswith(".fasta") and fasta_file.replace(".fasta", "") in intervals
+		)
+		species_start_times[species_name] = species_start_time
+
+		# Liberar memória (as tarefas guardam apenas os intervalos de cada cromossomo)
+		del intervals
 		gc.collect()
 
+	def species_done(species_name, results):
+		"""Executado no processo principal quando todos os cromossomos da espécie terminam"""
+		# Índice de hashes das sequências extraídas, usado para processar cada conteúdo uma única vez
+		sequence_dedup.load_hash_index(os.path.join(data_folder, species_name, "seq"))
+
 		# Timer para a espécie
 		species_end_time = time.time()
-		print(f"Espécie {species_name} processada em {species_end_time - species_start_time:.2f} segundos.\n")
-
-		# Atualizar o status da espécie para "processada"
-		update_status(species_name, 1)
\ No newline at end of file
+		print(f"Espécie {species_name} processada em {species_end_time - species_start_times[species_name]:.2f} segundos.\n")
+
+		# Atualizar o status da espécie para "processada" (ou deixá-la para a próxima execução se algum cromossomo falhou)
+		failed = scheduler.failures(results)
+		if failed:
+			print(f"Espécie {species_name}: {len(failed)} cromossomo(s) falharam; ela será reprocessada na próxima execução.\n")
+		update_status(species_name, manifest.WAITING if failed else manifest.SUCCESS)
+
+	scheduler.run_tasks(tasks, species_done, groups=species_start_times)
+	if tracing.finish():
+		print(f"Trace salvo em {tracing.TRACE_FILE}")
+	for report in profiling.finish():
+		print(f"Profile salvo em {report}")
+	print("Processamento Finalizado!")
\ No newline at end of file
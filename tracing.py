@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+
+# Linha do tempo no formato Chrome trace (chrome://tracing, ui.perfetto.dev), ligada só quando TRACE_FILE
+# é definido (ex.: TRACE_FILE=trace.json python mathfeature_processing.py)
+TRACE_FILE = os.environ.get("TRACE_FILE")
+
+# Cada processo grava seus eventos em <TRACE_FILE>.parts/<pid>.jsonl; finish() junta tudo no TRACE_FILE
+_part = None
+_part_pid = None
+_lock = threading.Lock()
+
+def enabled():
+	return bool(TRACE_FILE)
+
+def _parts_dir():
+	return f"{TRACE_FILE}.parts"
+
+def start():
+	"""Descarta eventos de execuções anteriores (chamado pelo processo principal antes de criar os workers)"""
+	global _part, _part_pid
+	if not enabled():
+		return
+	shutil.rmtree(_parts_dir(), ignore_errors=True)
+	_part = _part_pid = None
+
+def _write(event):
+	global _part, _part_pid
+	with _lock:
+		if _part_pid != os.getpid():  # Processo novo (fork): abre o próprio arquivo
+			os.makedirs(_parts_dir(), exist_ok=True)
+			_part = open(os.path.join(_parts_dir(), f"{os.getpid()}.jsonl"), "a", buffering=1)
+			_part_pid = os.getpid()
+		_part.write(json.dumps(event) + "\n")
+
+@contextmanager
+def span(name, category="task", **args):
+	"""Registra o bloco como um evento completo (início, duração, processo, thread e args: espécie, TE, operação...)"""
+	if not enabled():
+		yield
+		return
+	start_us = time.time_ns() // 1000  # Relógio de parede: comparável entre processos
+	try:
+		yield
+	finally:
+		_write({
+			"name": name, "cat": category, "ph": "X",
+			"ts": start_us, "dur": time.time_ns() // 1000 - start_us,
+			"pid": os.getpid(), "tid": threading.get_ident() % 1_000_000,
+			"args": {key: str(value) for key, value in args.items()},
+		})
+
+def finish():
+	"""Junta os eventos de todos os processos no TRACE_FILE (um "processo" do trace por worker)"""
+	global _part, _part_pid
+	if not enabled() or not os.path.isdir(_parts_dir()):
+		return None
+	with _lock:
+		if _part is not None:
+			_part.close()
+		_part = _part_pid = None
+
+	events = []
+	for part in sorted(os.listdir(_parts_dir())):
+		pid = int(part.split(".")[0])
+		label = "principal" if pid == os.getpid() else f"worker {pid}"
+		events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": label}})
+		events.append({"name": "process_sort_index", "ph": "M", "pid": pid, "args": {"sort_index": 0 if pid == os.getpid() else pid}})
+		with open(os.path.join(_parts_dir(), part), "r") as f:
+			for line in f:
+				try:
+					events.append(json.loads(line))
+				except ValueError:
+					pass  # Última linha de um worker interrompido no meio da escrita
+
+	tmp_path = f"{TRACE_FILE}.tmp"
+	with open(tmp_path, "w") as f:
+		json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+	os.replace(tmp_path, TRACE_FILE)
+	shutil.rmtree(_parts_dir(), ignore_errors=True)
+	return TRACE_FILE